@@ -0,0 +1,185 @@
+"""
+cache.py — Content-addressed cache of endpoint results.
+
+Keys are SHA-256 digests over the document bytes plus everything else that
+changes the output: endpoint, bank_name and a pipeline / prompt version.
+Re-uploading the same statement (retries, double-clicks, re-imports) then
+skips OCR, Camelot and Gemini entirely.
+
+Two tiers:
+  * Memory — LRU, evicted by total serialized size (RESULT_CACHE_MAX_MB)
+  * Disk   — optional JSON files under RESULT_CACHE_DIR, survive restarts
+
+Readers may pass a max_age: entries older than that (by write time, the
+file's mtime on disk) are evicted on lookup and count as a miss.
+
+Methods are blocking (disk I/O) and thread-safe; call them via run_io.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+from app.utils import setup_logger
+
+logger = setup_logger("cache")
+
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")   # empty = memory only
+
+# Bump whenever a change to parsing / OCR / normalization alters the output,
+# so results computed by older code are not served.
+PIPELINE_VERSION = "3"
+
+
+def cache_key(data: bytes, endpoint: str, version: str, bank_name: Optional[str] = None) -> str:
+    """Digest of the document bytes plus every input that affects the result."""
+    h = hashlib.sha256()
+    h.update(hashlib.sha256(data).digest())
+    for part in (endpoint, version, (bank_name or "").strip().lower()):
+        h.update(b"\0")
+        h.update(part.encode("utf-8"))
+    return h.hexdigest()
+
+
+@dataclass
+class CacheStats:
+    entries: int = 0
+    bytes: int = 0
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expired: int = 0
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int, directory: str = ""):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.stats = CacheStats()
+        # key → (write time, serialized result)
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[dict]:
+        """Return the cached result for `key`, or None (also when older than `max_age` seconds)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, blob = entry
+                if max_age is None or now - stored_at <= max_age:
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return json.loads(blob)
+                self._drop(key)
+                self.stats.expired += 1
+                self.stats.misses += 1
+        if entry is not None:
+            # Expired — the disk copy was written at the same time
+            self._remove_disk(key)
+            return None
+
+        disk = self._read_disk(key)
+        if disk is not None and max_age is not None and now - disk[0] > max_age:
+            self._remove_disk(key)
+            with self._lock:
+                self.stats.expired += 1
+            disk = None
+        if disk is None:
+            with self._lock:
+                self.stats.misses += 1
+            return None
+
+        stored_at, blob = disk
+        with self._lock:
+            self.stats.hits += 1
+            self.stats.disk_hits += 1
+            self._store(key, blob, stored_at)      # promote to the memory tier
+        return json.loads(blob)
+
+    def put(self, key: str, value: dict) -> None:
+        """Store a JSON-serializable result in both tiers."""
+        blob = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            self._store(key, blob, time.time())
+        self._write_disk(key, blob)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return asdict(self.stats)
+
+    # -- memory tier (caller holds the lock) --------------------------------
+
+    def _store(self, key: str, blob: bytes, stored_at: float) -> None:
+        if len(blob) > self.max_bytes:
+            return
+        self._drop(key)
+        self._entries[key] = (stored_at, blob)
+        self.stats.bytes += len(blob)
+        while self.stats.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.stats.bytes -= len(evicted)
+            self.stats.evictions += 1
+        self.stats.entries = len(self._entries)
+
+    def _drop(self, key: str) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.stats.bytes -= len(old[1])
+            self.stats.entries = len(self._entries)
+
+    # -- disk tier ----------------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, bytes]]:
+        """(write time, serialized result) from the disk tier, or None."""
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return os.fstat(f.fileno()).st_mtime, f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as exc:
+            logger.warning(f"Result cache read failed for {key[:12]}: {exc}")
+            return None
+
+    def _remove_disk(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _write_disk(self, key: str, blob: bytes) -> None:
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename so a crash never leaves a truncated entry behind
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            logger.warning(f"Result cache write failed for {key[:12]}: {exc}")
+
+
+result_cache = ResultCache(
+    max_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024),
+    directory=RESULT_CACHE_DIR,
+)
@@ -0,0 +1,220 @@
+"""
+document.py — One opened PDF shared by every stage of a request.
+
+A DocumentSession wraps the raw bytes and lazily opens / caches:
+  * the PyMuPDF document and the pdfplumber PDF (opened at most once each)
+  * per-page text-layer text and page geometry
+  * rendered page images (PNG) for callers that need encoded images, or
+    colour arrays for callers that re-encode them (Gemini Vision)
+  * a single temp-file copy for tools that need a path (Camelot)
+
+OCR does not go through PNG at all: render_gray() hands the pixmap's
+sample buffer to NumPy as a zero-copy grayscale view.
+
+pdf_parser, table_extractor and ocr all accept a session, so a text PDF is
+parsed once instead of once per stage. Sessions hold open handles and are
+therefore process-local: create one inside the worker job that uses it.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from app.metrics import timed
+from app.utils import bytes_to_stream, setup_logger
+
+logger = setup_logger("document")
+
+
+class _PixmapView:
+    """
+    Exposes a PyMuPDF Pixmap's samples through the NumPy array interface.
+    The resulting array's base is this object, which keeps the Pixmap (and
+    therefore the buffer) alive for as long as the array is referenced.
+    """
+
+    def __init__(self, pix):
+        self._pix = pix
+        shape = (pix.height, pix.width) if pix.n == 1 else (pix.height, pix.width, pix.n)
+        strides = (pix.stride, 1) if pix.n == 1 else (pix.stride, pix.n, 1)
+        self.__array_interface__ = {
+            "shape": shape,
+            "strides": strides,
+            "typestr": "|u1",
+            "data": (pix.samples_ptr, False),
+            "version": 3,
+        }
+
+
+class DocumentSession:
+    """
+    Open with raw bytes, or with `path` to a PDF already on disk — the latter
+    lets several worker jobs open the same document without shipping its bytes.
+    """
+
+    def __init__(self, data: Optional[bytes] = None, path: Optional[str] = None):
+        if data is None and path is None:
+            raise ValueError("DocumentSession needs either data or path")
+        self.data = data
+        self.path = path
+        self._fitz_doc = None
+        self._plumber_pdf = None
+        self._tmp_path: Optional[str] = None
+        self._page_text: Dict[int, str] = {}
+        self._page_size: Dict[int, Tuple[float, float]] = {}
+        self._rendered: Dict[Tuple[int, float], bytes] = {}
+        # PyMuPDF documents are not thread-safe; page threads (OCR) go through this
+        self._lock = threading.RLock()
+
+    # -- context manager ---------------------------------------------------
+
+    def __enter__(self) -> "DocumentSession":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release open handles, cached renders and the temp file."""
+        with self._lock:
+            if self._plumber_pdf is not None:
+                self._plumber_pdf.close()
+                self._plumber_pdf = None
+            if self._fitz_doc is not None:
+                self._fitz_doc.close()
+                self._fitz_doc = None
+            self._rendered.clear()
+            if self._tmp_path is not None:
+                try:
+                    os.unlink(self._tmp_path)
+                except OSError:
+                    pass
+                self._tmp_path = None
+
+    # -- opened handles ----------------------------------------------------
+
+    @contextmanager
+    def locked(self) -> Iterator["DocumentSession"]:
+        """Hold the session's lock while using fitz_doc pages directly (PyMuPDF is not thread-safe)."""
+        with self._lock:
+            yield self
+
+    @property
+    def fitz_doc(self):
+        """The PyMuPDF document, opened on first access."""
+        with self._lock:
+            if self._fitz_doc is None:
+                try:
+                    import fitz  # PyMuPDF
+                except ImportError:
+                    raise RuntimeError("PyMuPDF is required to open PDF documents")
+                if self.path is not None:
+                    self._fitz_doc = fitz.open(self.path, filetype="pdf")
+                else:
+                    self._fitz_doc = fitz.open(stream=self.data, filetype="pdf")
+            return self._fitz_doc
+
+    @property
+    def plumber_pdf(self):
+        """The pdfplumber PDF, opened on first access. Raises ImportError if missing."""
+        if self._plumber_pdf is None:
+            import pdfplumber
+            source = self.path if self.path is not None else bytes_to_stream(self.data)
+            self._plumber_pdf = pdfplumber.open(source)
+        return self._plumber_pdf
+
+    @property
+    def page_count(self) -> int:
+        return self.fitz_doc.page_count
+
+    # -- per-page caches (page numbers are 1-based) -------------------------
+
+    def page_text(self, page_no: int) -> str:
+        """Text layer of a page as seen by PyMuPDF."""
+        with self._lock:
+            if page_no not in self._page_text:
+                page = self.fitz_doc[page_no - 1]
+                self._page_text[page_no] = page.get_text("text") or ""
+            return self._page_text[page_no]
+
+    def page_size(self, page_no: int) -> Tuple[float, float]:
+        """(width, height) of a page in PDF points."""
+        with self._lock:
+            if page_no not in self._page_size:
+                rect = self.fitz_doc[page_no - 1].rect
+                self._page_size[page_no] = (rect.width, rect.height)
+            return self._page_size[page_no]
+
+    @timed("render_page")
+    def render_png(self, page_no: int, zoom: float = 2.0) -> bytes:
+        """Render a page to PNG bytes (cached per page and zoom)."""
+        key = (page_no, zoom)
+        with self._lock:
+            if key not in self._rendered:
+                import fitz
+                page = self.fitz_doc[page_no - 1]
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                self._rendered[key] = pix.tobytes("png")
+            return self._rendered[key]
+
+    @timed("render_page")
+    def render_gray(self, page_no: int, zoom: float = 2.0) -> np.ndarray:
+        """
+        Render a page straight to 8-bit grayscale and return the pixmap's
+        samples as a 2-D uint8 array, without encoding or copying.
+        Not cached: each OCR page thread renders, uses and drops its own page.
+        """
+        import fitz
+        with self._lock:
+            page = self.fitz_doc[page_no - 1]
+            pix = page.get_pixmap(
+                matrix=fitz.Matrix(zoom, zoom),
+                colorspace=fitz.csGRAY,
+                alpha=False,
+            )
+        return np.asarray(_PixmapView(pix))
+
+    @timed("render_page")
+    def render_color(self, page_no: int, zoom: float = 2.0) -> np.ndarray:
+        """Render a page to an 8-bit BGR array (OpenCV channel order), for encoders like cv2.imencode."""
+        import fitz
+        with self._lock:
+            page = self.fitz_doc[page_no - 1]
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False)
+        rgb = np.asarray(_PixmapView(pix))
+        return np.ascontiguousarray(rgb[:, :, ::-1])
+
+    # -- file-path access --------------------------------------------------
+
+    def file_path(self) -> str:
+        """Path to an on-disk copy of the PDF, written once per session."""
+        if self.path is not None:
+            return self.path
+        with self._lock:
+            if self._tmp_path is None:
+                with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                    tmp.write(self.data)
+                    self._tmp_path = tmp.name
+            return self._tmp_path
+
+
+PdfSource = Union[bytes, DocumentSession]
+
+
+@contextmanager
+def open_session(source: PdfSource) -> Iterator[DocumentSession]:
+    """
+    Yield `source` unchanged if it is already a session (the caller owns it),
+    otherwise wrap the bytes in a temporary session closed on exit.
+    """
+    if isinstance(source, DocumentSession):
+        yield source
+        return
+    with DocumentSession(source) as session:
+        yield session
@@ -0,0 +1,205 @@
+"""
+executor.py — Bounded worker pools for the blocking pipeline stages.
+
+Two pools:
+  * CPU pool (processes) — OCR, Camelot, OpenCV, PDF parsing, normalization
+  * IO pool  (threads)   — blocking file / network work that releases the GIL
+
+Every stage is dispatched with `await run_cpu(fn, *args)` or
+`await run_io(fn, *args)` so the event loop stays free to serve /health and
+other uploads while a scanned PDF is being processed.
+
+Each pool admits at most `size` jobs at once; callers beyond that wait in a
+queue whose depth is tracked (and optionally capped with POOL_MAX_QUEUE).
+
+Process-pool jobs run through metrics.run_collecting_stages(), so the stage
+timings they record in the worker are returned with the result and added
+to this process's /metrics.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+from app.metrics import record_stages, run_collecting_stages
+from app.utils import setup_logger
+
+logger = setup_logger("executor")
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+# 0 disables the process pool — CPU stages then run in the IO thread pool
+# (handy for local debugging, where breakpoints in child processes are awkward).
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(min(os.cpu_count() or 1, 4))))
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "8"))
+# Max callers allowed to wait for a busy pool before new work is rejected (0 = unbounded)
+POOL_MAX_QUEUE = int(os.getenv("POOL_MAX_QUEUE", "0"))
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a pool's wait queue is full and new work must be rejected."""
+
+
+# ---------------------------------------------------------------------------
+# Pool wrapper with queue-depth accounting
+# ---------------------------------------------------------------------------
+
+@dataclass
+class PoolStats:
+    size: int
+    queued: int = 0        # waiting for a free worker slot
+    active: int = 0        # currently running in the executor
+    completed: int = 0
+    failed: int = 0
+
+
+class _Pool:
+    def __init__(self, name: str, size: int, factory: Callable[[int], Executor], collect_stages: bool = False):
+        self.name = name
+        self.stats = PoolStats(size=max(size, 1))
+        self._factory = factory
+        # Jobs run in other processes: ship their stage timings back with the result
+        self._collect_stages = collect_stages
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self._get_executor()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._slots = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if POOL_MAX_QUEUE and self.stats.queued >= POOL_MAX_QUEUE:
+            raise PoolSaturatedError(
+                f"{self.name} pool is saturated ({self.stats.queued} jobs queued)"
+            )
+
+        slots = self._get_slots()
+        self.stats.queued += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.stats.queued -= 1
+
+        self.stats.active += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if self._collect_stages:
+                call = functools.partial(run_collecting_stages, fn, *args, **kwargs)
+            else:
+                call = functools.partial(fn, *args, **kwargs)
+            result = await loop.run_in_executor(self._get_executor(), call)
+        except BrokenProcessPool:
+            self.stats.failed += 1
+            logger.error(f"{self.name} pool worker died — recreating pool")
+            self.shutdown()
+            raise RuntimeError(f"{self.name} pool worker crashed while running {fn.__name__}")
+        except BaseException as exc:
+            self.stats.failed += 1
+            record_stages(getattr(exc, "stage_timings", ()))
+            raise
+        else:
+            self.stats.completed += 1
+            if self._collect_stages:
+                result, stages = result
+                record_stages(stages)
+            return result
+        finally:
+            self.stats.active -= 1
+            slots.release()
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._factory(self.stats.size)
+                logger.info(f"Started {self.name} pool with {self.stats.size} workers")
+            return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.stats.size)
+        return self._slots
+
+
+def _init_worker() -> None:
+    # Pages are the unit of parallelism; Tesseract's own OpenMP threads would
+    # only oversubscribe the cores. OpenMP reads this once, when the library
+    # loads, so it must be set before the first OCR call in the worker.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def _make_process_pool(size: int) -> Executor:
+    # "spawn" avoids forking a process that already runs an event loop and threads
+    return ProcessPoolExecutor(
+        max_workers=size,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def _make_thread_pool(size: int) -> Executor:
+    return ThreadPoolExecutor(max_workers=size, thread_name_prefix="doc-io")
+
+
+_io_pool = _Pool("io", IO_POOL_SIZE, _make_thread_pool)
+_cpu_pool = (
+    _Pool("cpu", CPU_POOL_SIZE, _make_process_pool, collect_stages=True)
+    if CPU_POOL_SIZE > 0
+    else None
+)
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+async def run_cpu(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a CPU-bound stage in the process pool.
+    `fn` and its arguments must be picklable (module-level functions, bytes, dataclasses).
+    """
+    pool = _cpu_pool or _io_pool
+    return await pool.run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking, GIL-releasing call (file / socket / subprocess) in the thread pool."""
+    return await _io_pool.run(fn, *args, **kwargs)
+
+
+def start_pools() -> None:
+    """Eagerly create the pools (called from the FastAPI lifespan)."""
+    _io_pool.start()
+    if _cpu_pool is not None:
+        _cpu_pool.start()
+
+
+def shutdown_pools() -> None:
+    """Stop all pools; queued-but-unstarted jobs are cancelled."""
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown()
+    _io_pool.shutdown()
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Snapshot of pool sizes and queue depths, e.g. for /health."""
+    stats = {"io": asdict(_io_pool.stats)}
+    if _cpu_pool is not None:
+        stats["cpu"] = asdict(_cpu_pool.stats)
+    return stats
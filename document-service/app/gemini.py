@@ -0,0 +1,170 @@
+"""
+gemini.py — Rate-limited, retrying POSTs to the Gemini REST API.
+
+Every Gemini call in the service goes through gemini_post(), which keeps a
+multi-page fan-out inside the API quota instead of bursting into 429s:
+
+  * Token bucket  — at most GEMINI_RPM requests per minute, with bursts of
+                    up to GEMINI_BURST
+  * In-flight cap — at most GEMINI_MAX_IN_FLIGHT requests open at once
+  * Retries       — 429 and 5xx answers (and failed connects) are retried
+                    up to GEMINI_MAX_RETRIES times with exponential backoff
+                    and full jitter, honouring Retry-After when Gemini sends it
+
+Limits are per process (the API process — Gemini is only called from the
+event loop). gemini_stats() reports throttling and retry counters on /health
+for sizing the quota.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import httpx
+
+from app.http_client import get_http_client
+from app.metrics import GEMINI_RESPONSES, stage
+from app.utils import setup_logger
+
+logger = setup_logger("gemini")
+
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "10"))
+GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE_S = float(os.getenv("GEMINI_BACKOFF_BASE_S", "1.0"))
+GEMINI_BACKOFF_MAX_S = float(os.getenv("GEMINI_BACKOFF_MAX_S", "30"))
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class GeminiStats:
+    requests: int = 0            # HTTP attempts, retries included
+    throttled: int = 0           # attempts that waited for a rate-limit token
+    throttle_wait_s: float = 0.0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    retries: int = 0
+    retries_429: int = 0
+    retries_5xx: int = 0
+    retries_connect: int = 0
+    gave_up: int = 0             # still failing after GEMINI_MAX_RETRIES
+
+
+_stats = GeminiStats()
+
+
+def gemini_stats() -> dict:
+    stats = asdict(_stats)
+    stats["throttle_wait_s"] = round(stats["throttle_wait_s"], 3)
+    return stats
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`; acquire() waits for one."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Take a token; returns the seconds spent waiting for it."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        async with self._lock:          # waiters are served in arrival order
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+_limits: Optional[tuple] = None      # (event loop, TokenBucket, in-flight Semaphore)
+
+
+def _get_limits():
+    """The bucket and in-flight semaphore, created on the running loop (asyncio primitives are loop-bound)."""
+    global _limits
+    loop = asyncio.get_running_loop()
+    if _limits is None or _limits[0] is not loop:
+        _limits = (loop, TokenBucket(GEMINI_RPM / 60.0, GEMINI_BURST), asyncio.Semaphore(max(1, GEMINI_MAX_IN_FLIGHT)))
+    return _limits[1], _limits[2]
+
+
+async def gemini_post(url: str, payload: dict, timeout: float) -> httpx.Response:
+    """
+    POST to Gemini within the rate limit and in-flight cap. Returns the last
+    response (possibly still a 429 / 5xx once retries run out); re-raises
+    the connect error if the last attempt could not connect.
+    """
+    bucket, slots = _get_limits()
+    attempt = 0
+    while True:
+        waited = await bucket.acquire()
+        if waited > 0:
+            _stats.throttled += 1
+            _stats.throttle_wait_s += waited
+
+        response: Optional[httpx.Response] = None
+        error: Optional[httpx.ConnectError] = None
+        async with slots:
+            _stats.requests += 1
+            _stats.in_flight += 1
+            _stats.peak_in_flight = max(_stats.peak_in_flight, _stats.in_flight)
+            try:
+                with stage("gemini_http"):
+                    response = await get_http_client().post(url, json=payload, timeout=timeout)
+            except httpx.ConnectError as exc:
+                error = exc
+            finally:
+                _stats.in_flight -= 1
+        GEMINI_RESPONSES.inc(status=response.status_code if response is not None else "connect_error")
+
+        if response is not None and response.status_code not in _RETRY_STATUS:
+            return response
+        if attempt >= GEMINI_MAX_RETRIES:
+            _stats.gave_up += 1
+            if error is not None:
+                raise error
+            return response
+
+        attempt += 1
+        _stats.retries += 1
+        if error is not None:
+            _stats.retries_connect += 1
+            reason = f"connect error ({error})"
+        elif response.status_code == 429:
+            _stats.retries_429 += 1
+            reason = "429"
+        else:
+            _stats.retries_5xx += 1
+            reason = str(response.status_code)
+        delay = _backoff(attempt, response)
+        logger.warning(f"Gemini {reason} — retry {attempt}/{GEMINI_MAX_RETRIES} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def _backoff(attempt: int, response: Optional[httpx.Response]) -> float:
+    """Retry-After when given, else full-jitter exponential backoff."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after", "")
+        try:
+            return min(float(retry_after), GEMINI_BACKOFF_MAX_S)
+        except ValueError:
+            pass
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX_S, GEMINI_BACKOFF_BASE_S * 2 ** (attempt - 1)))
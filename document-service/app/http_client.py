@@ -0,0 +1,133 @@
+"""
+http_client.py — One application-wide httpx.AsyncClient.
+
+Supabase file fetches and Gemini REST calls go to a handful of hosts over
+and over; a shared client keeps those connections alive (and multiplexes
+them over HTTP/2 when `h2` is installed) instead of paying a TCP + TLS
+handshake per request.
+
+The client is opened in the FastAPI lifespan and closed on shutdown.
+Connection reuse is measured with httpx's per-request "trace" extension:
+every request that had to open a TCP connection counts as a new connection,
+the rest rode on a pooled one.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import httpx
+
+from app.utils import setup_logger
+
+logger = setup_logger("http-client")
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "10"))
+# Default read/write timeout; callers pass their own per request (Gemini: 90 s)
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "30"))
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "true").lower() == "true"
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    new_connections: int = 0       # requests that opened a TCP connection
+    reused_connections: int = 0    # requests served on a pooled connection
+    http2_requests: int = 0
+    error_responses: int = 0       # 4xx / 5xx answers
+
+
+_stats = ConnectionStats()
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx[http2])
+        return True
+    except ImportError:
+        return False
+
+
+async def _trace(event_name: str, info: dict) -> None:
+    # httpcore emits e.g. "connection.connect_tcp.complete", "http2.send_request_headers.started"
+    if event_name == "connection.connect_tcp.complete":
+        _stats.new_connections += 1
+    elif event_name == "http2.send_request_headers.started":
+        _stats.http2_requests += 1
+
+
+async def _on_request(request: httpx.Request) -> None:
+    _stats.requests += 1
+    request.extensions["trace"] = _trace
+
+
+async def _on_response(response: httpx.Response) -> None:
+    if response.status_code >= 400:
+        _stats.error_responses += 1
+
+
+def _create_client() -> httpx.AsyncClient:
+    http2 = HTTP_HTTP2 and _http2_available()
+    if HTTP_HTTP2 and not http2:
+        logger.warning("HTTP/2 requested but 'h2' is not installed — using HTTP/1.1")
+
+    client = httpx.AsyncClient(
+        http2=http2,
+        follow_redirects=True,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT_S, connect=HTTP_CONNECT_TIMEOUT_S),
+        event_hooks={"request": [_on_request], "response": [_on_response]},
+    )
+    logger.info(
+        f"HTTP client ready (http2={http2}, max_connections={HTTP_MAX_CONNECTIONS}, "
+        f"keepalive={HTTP_MAX_KEEPALIVE})"
+    )
+    return client
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    The shared client. Created on first use if the lifespan has not opened
+    it yet (e.g. scripts that call fetch_file_from_url directly).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+def start_http_client() -> None:
+    """Open the shared client (called from the FastAPI lifespan)."""
+    get_http_client()
+
+
+async def close_http_client() -> None:
+    """Close the shared client and its pooled connections."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+def http_stats() -> dict:
+    """Connection-reuse counters, e.g. for /health."""
+    _stats.reused_connections = max(_stats.requests - _stats.new_connections, 0)
+    return asdict(_stats)
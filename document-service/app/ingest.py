@@ -0,0 +1,105 @@
+"""
+ingest.py — Size-bounded intake of uploaded documents.
+
+Two layers keep an oversized upload from ever being buffered whole:
+
+  * BodySizeLimitMiddleware — rejects a request with 413 from its
+    Content-Length alone, and stops reading a chunked body the moment it
+    passes the route's limit (before the multipart parser has spooled it).
+  * read_upload() — per-file check on a parsed UploadFile. Starlette has
+    already spooled the part to a temp file above 1 MB, so the size is known
+    without reading it; only files within FILE_SIZE_LIMIT_MB are loaded.
+
+URL downloads are bounded the same way in utils.fetch_file_from_url.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app.utils import FILE_SIZE_LIMIT_MB, FileTooLargeError, max_file_bytes, setup_logger
+
+logger = setup_logger("ingest")
+
+# Room for multipart boundaries and the small form fields next to the file
+_FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+def request_limit_bytes(files: int = 1) -> int:
+    """Largest acceptable request body carrying `files` documents."""
+    return files * max_file_bytes() + _FORM_OVERHEAD_BYTES
+
+
+class BodySizeLimitMiddleware:
+    """
+    Pure ASGI middleware enforcing a maximum request body size.
+    `overrides` maps exact paths to their own limit (e.g. the batch endpoint).
+    """
+
+    def __init__(self, app, max_bytes: int, overrides: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.overrides = overrides or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.overrides.get(scope["path"], self.max_bytes)
+
+        content_length = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                content_length = int(value) if value.isdigit() else None
+                break
+        if content_length is not None and content_length > limit:
+            logger.warning(f"Rejected {scope['path']}: Content-Length {content_length} > {limit}")
+            await _send_413(send, limit)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside body parsing → FastAPI re-raises HTTPExceptions as-is
+                    raise HTTPException(status_code=413, detail=_limit_detail(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(file: UploadFile, limit_mb: float = FILE_SIZE_LIMIT_MB) -> bytes:
+    """Read an UploadFile, raising FileTooLargeError without loading oversized files."""
+    limit = max_file_bytes(limit_mb)
+    if file.size is not None and file.size > limit:
+        raise FileTooLargeError(file.size, limit_mb)
+
+    data = await file.read(limit + 1)
+    if len(data) > limit:
+        raise FileTooLargeError(None, limit_mb)
+    return data
+
+
+def _limit_detail(limit: int) -> str:
+    return f"Request body exceeds the {limit / (1024 * 1024):.1f} MB limit"
+
+
+async def _send_413(send, limit: int) -> None:
+    body = json.dumps({"detail": _limit_detail(limit)}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
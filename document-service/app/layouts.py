@@ -0,0 +1,220 @@
+"""
+layouts.py — Which table column holds the date, description, amounts, balance.
+
+Column roles are resolved from a table's header row by substring hints
+(_COL_HINTS) and remembered per header fingerprint — a digest of the
+normalized header cells plus the bank name, when the request gives one.
+A bank's statements repeat the same header on every page and every upload,
+so the hint scan runs once per layout, not once per table.
+
+Banks where the hints misfire (or whose tables have no header row at all)
+get manual overrides from the JSON file named by BANK_LAYOUTS_FILE:
+
+    {
+      "hdfc": {"desc": "narration", "debit": "withdrawal amt", "credit": "deposit amt"},
+      "acme": [
+        {"header": ["Posted", "Memo", "Out", "In", "Bal"],
+         "date": 0, "desc": 1, "debit": 2, "credit": 3, "balance": 4},
+        {"date": 0, "desc": 2, "amount": 3}
+      ]
+    }
+
+Keys are bank names (case-insensitive); each entry maps roles (date, desc,
+debit, credit, amount, balance) to a column index or to header text
+(matched exactly, then as a substring). An entry with "header" applies only
+to tables with that header; the others apply to every table of the bank,
+including headerless ones. Roles an override leaves out use the hints.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from typing import Dict, List, Optional, Tuple, Union
+
+from app.utils import setup_logger
+
+logger = setup_logger("layouts")
+
+BANK_LAYOUTS_FILE = os.getenv("BANK_LAYOUTS_FILE", "")
+# Resolved layouts kept per process (one per distinct bank + header)
+LAYOUT_CACHE_SIZE = int(os.getenv("LAYOUT_CACHE_SIZE", "512"))
+
+_COL_HINTS = {
+    "date": ["date", "txn date", "value date", "transaction date"],
+    "desc": ["description", "particulars", "narration", "details", "remarks"],
+    "debit": ["debit", "dr", "withdrawal", "payment"],
+    "credit": ["credit", "cr", "deposit", "received"],
+    "balance": ["balance", "closing balance", "bal"],
+    "amount": ["amount", "txn amount"],
+}
+
+
+@dataclass(frozen=True)
+class ColumnLayout:
+    """Column index per role; None = no such column (row-level fallbacks apply)."""
+    date: Optional[int] = None
+    desc: Optional[int] = None
+    debit: Optional[int] = None
+    credit: Optional[int] = None
+    amount: Optional[int] = None
+    balance: Optional[int] = None
+
+    @classmethod
+    def from_header(cls, header: Optional[List[str]]) -> "ColumnLayout":
+        """The hint-based layout of a lower-cased header row."""
+        return cls(**{role: _col_index(header, hints) for role, hints in _COL_HINTS.items()})
+
+
+_ROLES = [f.name for f in fields(ColumnLayout)]
+
+
+def _col_index(header: Optional[List[str]], hints: List[str]) -> Optional[int]:
+    if not header:
+        return None
+    for i, h in enumerate(header):
+        for hint in hints:
+            if hint in h:
+                return i
+    return None
+
+
+def header_fingerprint(header: Optional[List[str]]) -> Optional[str]:
+    """Digest of a header row, insensitive to case and spacing; None without a header."""
+    if not header:
+        return None
+    canonical = "\x1f".join(" ".join(cell.lower().split()) for cell in header)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+class LayoutRegistry:
+    """Resolved layouts per (bank, header fingerprint), plus the manual overrides."""
+
+    def __init__(
+        self,
+        overrides: Optional[Dict[str, list]] = None,
+        max_entries: int = LAYOUT_CACHE_SIZE,
+        version: str = "",
+    ):
+        self._overrides = {bank.lower(): entries for bank, entries in (overrides or {}).items()}
+        # Digest of the override file these overrides were parsed from ("" = none)
+        self.version = version
+        self._cache: "OrderedDict[tuple, ColumnLayout]" = OrderedDict()
+        self._max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+
+    def resolve(self, header: Optional[List[str]], bank_name: Optional[str] = None) -> ColumnLayout:
+        """Layout for a table with this lower-cased header row (None = headerless table)."""
+        bank = (bank_name or "").strip().lower()
+        key = (bank, header_fingerprint(header))
+        with self._lock:
+            layout = self._cache.get(key)
+            if layout is not None:
+                self._cache.move_to_end(key)
+                return layout
+
+        layout = self._build(header, bank, key[1])
+        with self._lock:
+            self._cache[key] = layout
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return layout
+
+    def _build(self, header: Optional[List[str]], bank: str, fingerprint: Optional[str]) -> ColumnLayout:
+        layout = ColumnLayout.from_header(header)
+        override = self._override_for(bank, fingerprint)
+        if override is None:
+            return layout
+        changes = {}
+        for role in _ROLES:
+            if role in override:
+                changes[role] = _override_index(override[role], header)
+        logger.info(f"Applying '{bank}' layout override to columns {sorted(changes)}")
+        return replace(layout, **changes)
+
+    def _override_for(self, bank: str, fingerprint: Optional[str]) -> Optional[dict]:
+        if not bank:
+            return None
+        general = None
+        for entry in self._overrides.get(bank, []):
+            if "header" not in entry:
+                general = general or entry
+            elif header_fingerprint([c.lower() for c in entry["header"]]) == fingerprint:
+                return entry
+        return general
+
+
+def _override_index(value: Union[int, str, None], header: Optional[List[str]]) -> Optional[int]:
+    if value is None or isinstance(value, int):
+        return value
+    name = " ".join(str(value).lower().split())
+    cells = [" ".join(cell.split()) for cell in header or []]
+    if name in cells:
+        return cells.index(name)
+    return next((i for i, cell in enumerate(cells) if name in cell), None)
+
+
+# ---------------------------------------------------------------------------
+# Process-wide registry
+# ---------------------------------------------------------------------------
+
+def _load_overrides(path: str) -> Tuple[Dict[str, list], str]:
+    """(overrides per bank, digest of the file they came from); ({}, "") when there are none."""
+    if not path:
+        return {}, ""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        raw = json.loads(data)
+    except (OSError, ValueError) as exc:
+        logger.error(f"Could not read BANK_LAYOUTS_FILE '{path}': {exc} — no layout overrides")
+        return {}, ""
+    if not isinstance(raw, dict):
+        logger.error(f"BANK_LAYOUTS_FILE '{path}' must hold a JSON object of banks — no layout overrides")
+        return {}, ""
+    overrides = {bank: entries if isinstance(entries, list) else [entries] for bank, entries in raw.items()}
+    for bank, entries in overrides.items():
+        if not all(isinstance(entry, dict) for entry in entries):
+            logger.error(
+                f"BANK_LAYOUTS_FILE '{path}': '{bank}' must map to an object or a list of objects "
+                f"— no layout overrides"
+            )
+            return {}, ""
+    logger.info(f"Loaded layout overrides for {len(overrides)} banks from {path}")
+    return overrides, hashlib.sha256(data).hexdigest()[:12]
+
+
+_registry: Optional[LayoutRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> LayoutRegistry:
+    """The process-wide registry (created on first use, overrides loaded once)."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                overrides, version = _load_overrides(BANK_LAYOUTS_FILE)
+                _registry = LayoutRegistry(overrides, version=version)
+    return _registry
+
+
+def resolve_layout(header: Optional[List[str]], bank_name: Optional[str] = None) -> ColumnLayout:
+    return get_registry().resolve(header, bank_name)
+
+
+def layouts_version() -> str:
+    """
+    Digest of the override file the registry loaded, for result-cache keys
+    ("" without overrides). Read once with the overrides, so the key always
+    matches the layouts in use — an edited file takes effect on restart.
+    """
+    return get_registry().version
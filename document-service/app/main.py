@@ -4,6 +4,8 @@ main.py — FastAPI entry point for the Document Processing Service.
 Endpoints:
   GET  /health              — liveness check
   POST /process-document    — main processing endpoint
+  POST /process-document/stream — one document, transactions streamed per page (NDJSON)
+  POST /process-documents   — batch processing, streamed back as NDJSON
 
 Accepts:
   Multipart file upload  OR  JSON body with file_url
@@ -13,37 +15,79 @@ Accepts:
 from __future__ import annotations
 
 import asyncio
+import json
 import os
 import traceback
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
 
 from dotenv import load_dotenv
 
 # Load .env from document-service root (makes GEMINI_API_KEY available)
 load_dotenv()
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile, Request
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.exception_handlers import http_exception_handler, request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from pydantic import BaseModel, HttpUrl
 
 from app.utils import (
+    FileTooLargeError,
     detect_file_type,
     fetch_file_from_url,
     is_image_type,
     is_pdf_type,
     setup_logger,
-    validate_file_size,
 )
-from app.pdf_parser import parse_pdf, pdf_pages_to_images
-from app.ocr import extract_text_from_image, extract_text_from_images
-from app.table_extractor import extract_tables
+from app.ingest import BodySizeLimitMiddleware, read_upload, request_limit_bytes
+from app.executor import (
+    PoolSaturatedError,
+    pool_stats,
+    run_cpu,
+    run_io,
+    shutdown_pools,
+    start_pools,
+)
+from app.http_client import close_http_client, http_stats, start_http_client
+from app.ocr import OCR_PROFILE
+from app.cache import PIPELINE_VERSION, cache_key, result_cache
+from app.layouts import get_registry, layouts_version
+from app.gemini import gemini_stats
+from app.metrics import (
+    DOCUMENT_BYTES,
+    EXTRACTIONS,
+    PAGES,
+    POOL_STATS,
+    RESULT_CACHE_STATS,
+    MetricsMiddleware,
+    record_error,
+    render_metrics,
+)
+from app.vision import VisionError, vision_stats
+from app.vision import extract_transactions as vision_extract
+from app.pipeline import (
+    TABLE_ENGINE,
+    TABLE_ENGINES,
+    ExtractionResult,
+    PageExtraction,
+    extract_image,
+    extract_pdf,
+    extract_pdf_text,
+    merge_pages,
+    ocr_pdf_page,
+    spool_pdf,
+)
 from app.normalizer import (
-    normalize_text,
-    normalize_table_rows,
+    GEMINI_API_KEY as LLM_API_KEY,
+    LLM_ENABLED,
     llm_normalize,
-    NormalizeResult,
+    llm_version,
 )
+from app.reconcile import reconcile
 
 # ---------------------------------------------------------------------------
 # App setup
@@ -51,12 +95,41 @@ from app.normalizer import (
 
 logger = setup_logger("main")
 
+# Batch endpoint limits
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+# Whole-request cap for /process-documents (each file is still held to FILE_SIZE_LIMIT_MB)
+BATCH_MAX_REQUEST_MB = float(os.getenv("BATCH_MAX_REQUEST_MB", "200"))
+# Pages of one streamed scanned PDF OCR'd at once (each page is one CPU-pool job)
+STREAM_MAX_PAGE_JOBS = int(os.getenv("STREAM_MAX_PAGE_JOBS", "4"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the worker pools and HTTP client with the app; tear them down on shutdown."""
+    start_pools()
+    start_http_client()
+    get_registry()      # read BANK_LAYOUTS_FILE now, not on the first request's event loop
+    yield
+    await close_http_client()
+    shutdown_pools()
+
+
 app = FastAPI(
     title="PayLockr Document Processing Service",
     description="Extracts structured financial transactions from PDFs and images.",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
+)
+
+# Reject oversized bodies before they are read (and before multipart spooling).
+# Added first so CORS stays the outermost layer and 413s carry CORS headers.
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=request_limit_bytes(),
+    overrides={"/process-documents": int(BATCH_MAX_REQUEST_MB * 1024 * 1024)},
 )
 
 app.add_middleware(
@@ -67,6 +140,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost: counts every response, including 413s and CORS preflights
+app.add_middleware(MetricsMiddleware)
+
 # ---------------------------------------------------------------------------
 # Request / Response schemas
 # ---------------------------------------------------------------------------
@@ -76,6 +152,7 @@ class UrlRequest(BaseModel):
     user_id: Optional[str] = None
     file_type: Optional[str] = None
     bank_name: Optional[str] = None
+    table_engine: Optional[str] = None
 
 
 class Transaction(BaseModel):
@@ -91,6 +168,9 @@ class ProcessResponse(BaseModel):
     confidence: float
     pages_processed: int = 0
     extraction_method: str = "regex"
+    # Share of running-balance steps that add up (None: too few balances to check)
+    consistency: Optional[float] = None
+    unreconciled_rows: list[int] = []
 
 
 class ErrorResponse(BaseModel):
@@ -104,73 +184,40 @@ class ErrorResponse(BaseModel):
 
 @app.get("/health", tags=["system"])
 async def health():
-    """Liveness probe — returns 200 when the service is up."""
-    return {"status": "ok", "service": "document-processing"}
+    """Liveness probe — returns 200 when the service is up, plus pool, cache and HTTP stats."""
+    return {
+        "status": "ok",
+        "service": "document-processing",
+        "pools": pool_stats(),
+        "cache": result_cache.snapshot(),
+        "http": http_stats(),
+        "gemini_vision": vision_stats(),
+        "gemini": gemini_stats(),
+    }
+
+
+@app.get("/metrics", tags=["system"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint: request, stage, document and error metrics, plus pool / cache stats."""
+    for pool, stats in pool_stats().items():
+        for stat, value in stats.items():
+            POOL_STATS.set(value, pool=pool, stat=stat)
+    for stat, value in result_cache.snapshot().items():
+        RESULT_CACHE_STATS.set(value, stat=stat)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 # ---------------------------------------------------------------------------
 # Gemini Vision endpoint — simple image → transactions (like InkStrokes pattern)
 # ---------------------------------------------------------------------------
 
-EXTRACT_PROMPT = """You are a bank statement data extraction engine. You process both SCREENSHOT images and PDF-exported statements.
-
-Extract EVERY transaction row. Return ONLY a raw JSON object — absolutely no markdown, no fences, no commentary.
-
-JSON schema (one object per transaction):
-{
-  "transactions": [
-    {
-      "date": "YYYY-MM-DD or null if not visible",
-      "description": "<copy the ENTIRE narration line exactly character-by-character>",
-      "upi_ref": "<12-15 digit numeric UPI reference number, or null>",
-      "source": "<the FULL NAME of the person or merchant — see rules below>",
-      "amount": 0.00,
-      "type": "debit or credit",
-      "balance": 0.00
-    }
-  ],
-  "confidence": 0.95
-}
-
-=== FULL NAME EXTRACTION (most important rule) ===
-UPI narrations follow the format: UPI/DR-or-CR/REFNO/NAME/BANKIFSC/VPA
-The NAME segment is often abbreviated in the storage key, but the ACTUAL name of the sender/receiver
-may be spelled out more completely elsewhere in that same narration or in adjacent columns.
-
-Rules for "source" field:
-1. Scan ALL slash-separated segments in the narration for human names or merchant names.
-2. Pick the LONGEST and most complete name segment as the source.
-3. If the name looks like a VPA suffix (e.g. "chandra@okicici", "john.doe@ybl"), extract the full part before @ as the name.
-4. NEVER abbreviate: use "CHANDRA KUMAR" not "CHANDRAK", "INDSTOCKS INDIA" not "INDSTK".
-5. If you see both a short code and a full name in the narration (e.g. "INDSTOCKS" and "IndiaStocks Ltd"), use the longer full form.
-6. For wallet payments (PPE, PAYTM, PHONEPE): the name comes before the wallet code — use it.
-7. Copy the source EXACTLY as written in the statement — no guessing, no expanding abbreviations yourself.
-
-=== STRICT FIELD RULES ===
-- description: Verbatim entire narration. NEVER truncate. Every slash. Every character.
-  CORRECT: "UPI/DR/978584154770/CHANDRA KUMAR/HDFC0000240/chandrk@paytm"
-  WRONG:   "UPI/DR/978584154770/CHANDRA KUMAR/HDFC"  ← truncated
-- upi_ref: ONLY the numeric reference (12-15 digits). null for non-UPI rows.
-- date: YYYY-MM-DD. Convert DD-MM-YY, DD/MM/YYYY, etc. null if date column is blank/missing.
-- amount: Positive number from the non-zero Debit or Credit column. null if completely unreadable.
-- type: "debit" = money out (UPI/DR, withdrawal). "credit" = money in (UPI/CR, deposit, salary).
-- balance: Running balance after this row. null if column absent.
-- SKIP: column headers, opening balance, closing balance, subtotal/summary rows.
-- Include ALL individual transaction rows without exception."""
-
-
-
-
 @app.post("/extract-transactions", tags=["gemini-vision"])
-async def extract_transactions(file: UploadFile = File(...)):
+async def extract_transactions(response: Response, file: UploadFile = File(...)):
     """
-    Upload a bank statement screenshot → Gemini 1.5 Flash Vision → structured transactions JSON.
-    Calls the Gemini REST API directly via httpx — no google-generativeai package needed.
+    Upload a bank statement screenshot or PDF → Gemini 2.5 Flash Vision → structured transactions JSON.
+    PDF pages are rendered and sent concurrently, within the Gemini rate limit; transactions come back in page order.
+    Identical concurrent uploads share one Gemini call; results are cached (X-Cache: HIT / MISS / COALESCED).
     """
-    import json
-    import base64
-    import httpx
-
     # Get API key — loaded from .env at startup via load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY", "")
     if not api_key:
@@ -179,111 +226,24 @@ async def extract_transactions(file: UploadFile = File(...)):
             detail="GEMINI_API_KEY not set. Add it to document-service/.env and restart uvicorn."
         )
 
-    # Read uploaded image bytes and encode to base64
-    image_bytes = await file.read()
+    try:
+        data = await read_upload(file)
+    except FileTooLargeError as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
     mime_type = file.content_type or "image/png"
-    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
-
-    logger.info(f"[GeminiVision] Processing {file.filename} ({len(image_bytes)//1024} KB, {mime_type})")
-
-    # Gemini REST API — v1beta with gemini-2.5-flash (stable, supports image input on free tier)
-    # See: https://ai.google.dev/gemini-api/docs/models/gemini-2.5-flash
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}"
-
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": EXTRACT_PROMPT},
-                    {
-                        "inline_data": {
-                            "mime_type": mime_type,
-                            "data": image_b64,
-                        }
-                    },
-                ]
-            }
-        ],
-        "generationConfig": {
-            "temperature": 0,
-            "maxOutputTokens": 8192,
-        },
-    }
+    DOCUMENT_BYTES.observe(len(data), type=detect_file_type(data))
 
-    try:
-        async with httpx.AsyncClient(timeout=90.0) as client:
-            response = await client.post(url, json=payload)
-
-        if response.status_code != 200:
-            logger.error(f"[GeminiVision] API error {response.status_code}: {response.text[:300]}")
-            raise HTTPException(status_code=502, detail=f"Gemini API error {response.status_code}: {response.text[:200]}")
-
-        data = response.json()
-        raw = data["candidates"][0]["content"]["parts"][0]["text"].strip()
-        logger.info(f"[GeminiVision] Raw response:\n{raw[:500]}")
-
-        # Robustly strip markdown fences — handles ```json, ```JSON, ``` with/without newlines
-        import re
-        fence_match = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", raw, re.IGNORECASE)
-        if fence_match:
-            raw = fence_match.group(1).strip()
-        elif raw.startswith("```"):
-            # Fallback: remove all ``` markers line by line
-            raw = "\n".join(
-                line for line in raw.splitlines()
-                if not line.strip().startswith("```")
-            ).strip()
-
-        # Gemini sometimes returns JSON with a trailing comma before } — fix it
-        raw = re.sub(r",\s*([}\]])", r"\1", raw)
+    logger.info(f"[GeminiVision] Processing {file.filename} ({len(data)//1024} KB, {mime_type})")
 
-        try:
-            parsed = json.loads(raw)
-        except json.JSONDecodeError as e:
-            logger.error(f"[GeminiVision] JSON parse failed: {e}\nRaw was:\n{raw[:800]}")
-            raise HTTPException(
-                status_code=502,
-                detail=f"Gemini returned invalid JSON: {str(e)}. Raw: {raw[:200]}"
-            )
-
-        transactions = parsed.get("transactions", [])
-        confidence = float(parsed.get("confidence", 0.93))
-
-        # Validate and clean each transaction row
-        # Must match the ParsedTransaction interface in geminiService.ts exactly:
-        # { date, description, upi_ref, source, amount, type, balance }
-        clean = []
-        for t in transactions:
-            try:
-                date_val = t.get("date")
-                upi_ref_val = t.get("upi_ref")
-                source_val = t.get("source")
-
-                clean.append({
-                    "date": str(date_val) if date_val is not None and str(date_val).lower() != "null" else "",
-                    "description": str(t.get("description") or "Transaction"),
-                    "upi_ref": str(upi_ref_val) if upi_ref_val is not None and str(upi_ref_val).lower() != "null" else None,
-                    "source": str(source_val).strip() if source_val not in (None, "", "null") else None,
-                    "amount": float(t["amount"]) if t.get("amount") is not None else 0.0,
-                    "type": "credit" if str(t.get("type", "")).lower() == "credit" else "debit",
-                    "balance": float(t["balance"]) if t.get("balance") is not None and str(t.get("balance")).lower() != "null" else None,
-                })
-            except Exception as row_err:
-                logger.warning(f"[GeminiVision] Skipping malformed row: {t} — {row_err}")
-                continue  # skip malformed rows
-
-        logger.info(f"[GeminiVision] Extracted {len(clean)} transactions (confidence={confidence})")
-        return {"transactions": clean, "confidence": confidence, "source": "gemini-vision"}
-
-    except json.JSONDecodeError as e:
-        logger.error(f"[GeminiVision] JSON parse error: {e}\nRaw: {raw[:300]}")
-        raise HTTPException(status_code=500, detail=f"Gemini returned invalid JSON: {str(e)}")
-    except HTTPException:
-        raise
+    try:
+        result, cache_status = await vision_extract(data, mime_type, api_key)
+    except VisionError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
     except Exception as e:
         logger.error(f"[GeminiVision] Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-
+    response.headers["X-Cache"] = cache_status
+    return result
 
 
 # ---------------------------------------------------------------------------
@@ -303,19 +263,23 @@ async def extract_transactions(file: UploadFile = File(...)):
     summary="Extract transactions from a bank statement or invoice",
 )
 async def process_document_upload(
+    response: Response,
     file: Optional[UploadFile] = File(default=None),
     file_url: Optional[str] = Form(default=None),
     user_id: Optional[str] = Form(default=None),
     bank_name: Optional[str] = Form(default=None),
+    table_engine: Optional[str] = Form(default=None),
 ):
     """
     Process a document via **multipart file upload** or **file_url** form field.
 
     - Accepts PDF (text or scanned) or images (JPEG, PNG, TIFF, etc.)
+    - `table_engine` (auto | native | camelot) overrides TABLE_ENGINE for text PDFs
     - Returns structured transactions JSON
     """
+    engine = _table_engine(table_engine)
     data, filename = await _resolve_input(file, file_url)
-    return await _run_pipeline(data, filename, bank_name)
+    return await _run_pipeline(data, filename, bank_name, response, engine)
 
 
 # ---------------------------------------------------------------------------
@@ -328,30 +292,288 @@ async def process_document_upload(
     tags=["processing"],
     summary="Extract transactions from a URL-hosted document",
 )
-async def process_document_url(body: UrlRequest):
+async def process_document_url(body: UrlRequest, response: Response):
     """
     Process a document by URL (e.g. Supabase Storage public URL).
 
     TypeScript integration point — send the Supabase file URL directly.
     """
-    try:
-        data = await asyncio.wait_for(
-            fetch_file_from_url(body.file_url), timeout=30.0
+    engine = _table_engine(body.table_engine)
+    data, _ = await _resolve_input(None, body.file_url)
+    return await _run_pipeline(data, body.file_url, body.bank_name, response, engine)
+
+
+# ---------------------------------------------------------------------------
+# Streaming endpoint — one document, transactions emitted page by page
+# ---------------------------------------------------------------------------
+
+@app.post(
+    "/process-document/stream",
+    tags=["processing"],
+    summary="Extract transactions, streaming each page's results as they finish",
+)
+async def process_document_stream(
+    file: Optional[UploadFile] = File(default=None),
+    file_url: Optional[str] = Form(default=None),
+    user_id: Optional[str] = Form(default=None),
+    bank_name: Optional[str] = Form(default=None),
+    table_engine: Optional[str] = Form(default=None),
+):
+    """
+    Same input as `/process-document`, answered as NDJSON events:
+
+    - `{"event": "progress", "stage", "pages_done", "pages_total"}`
+    - `{"event": "page", "page", "transactions"}` — one page's transactions
+      (`page` is null when a text PDF is extracted as a whole)
+    - `{"event": "page_error", "page", "detail"}` — that page is skipped
+    - `{"event": "summary", ...}` — the final `/process-document` response,
+      plus `"cached"`; or `{"event": "error", "status_code", "detail"}`
+
+    Scanned PDFs are OCR'd page by page, so the first transactions arrive
+    after one page rather than after the whole document.
+    """
+    engine = _table_engine(table_engine)
+    data, filename = await _resolve_input(file, file_url)
+    file_type = detect_file_type(data)
+    if not (is_image_type(file_type) or is_pdf_type(file_type)):
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported file type '{file_type}'. Send a PDF or image.",
         )
-    except asyncio.TimeoutError:
-        raise HTTPException(status_code=504, detail="Timeout fetching document from URL")
+
+    logger.info(f"Streaming '{filename}' | type={file_type} | size={len(data)} bytes")
+    DOCUMENT_BYTES.observe(len(data), type=file_type)
+    return StreamingResponse(
+        _stream_document(data, file_type, bank_name, engine),
+        media_type="application/x-ndjson",
+    )
+
+
+def _event(event: str, **fields) -> str:
+    return json.dumps({"event": event, **jsonable_encoder(fields)}) + "\n"
+
+
+def _page_event(page: Optional[int], extraction: ExtractionResult | PageExtraction) -> str:
+    return _event(
+        "page",
+        page=page,
+        transactions=[t.to_dict() for t in extraction.result.transactions],
+    )
+
+
+async def _stream_document(
+    data: bytes,
+    file_type: str,
+    bank_name: Optional[str],
+    table_engine: str,
+) -> AsyncIterator[str]:
+    """Event generator behind /process-document/stream."""
+    key = cache_key(data, "process-document", _pipeline_version(table_engine), bank_name)
+    cached = await run_io(result_cache.get, key)
+    if cached is not None:
+        yield _event("summary", cached=True, **cached)
+        return
+
+    try:
+        if is_image_type(file_type):
+            yield _event("progress", stage="ocr", pages_done=0, pages_total=1)
+            extraction = await run_cpu(extract_image, data)
+            yield _page_event(1, extraction)
+            yield _event("progress", stage="ocr", pages_done=1, pages_total=1)
+        else:
+            yield _event("progress", stage="parse", pages_done=0, pages_total=None)
+            path = await run_io(spool_pdf, data)
+            try:
+                layer = await run_cpu(extract_pdf_text, path, table_engine, bank_name)
+                extraction = layer.extraction
+                if extraction is not None:
+                    yield _page_event(None, extraction)
+                    yield _event("progress", stage="parse", pages_done=layer.page_count,
+                                 pages_total=layer.page_count)
+                if layer.ocr_pages:
+                    # Scanned PDF, or the image-only pages of a hybrid one
+                    pages: List[PageExtraction] = []
+                    async for line in _stream_ocr_pages(path, layer.ocr_pages, pages):
+                        yield line
+                    if not pages and extraction is None:
+                        raise HTTPException(status_code=422, detail="OCR failed on every page")
+                    extraction = merge_pages(layer, pages)
+            finally:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+        processed = await _finalize(extraction)
+        if processed.transactions:
+            await run_io(result_cache.put, key, jsonable_encoder(processed))
+        yield _event("summary", cached=False, **processed.model_dump())
+
+    except HTTPException as exc:
+        record_error(exc)
+        yield _event("error", status_code=exc.status_code, detail=exc.detail)
     except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"Could not fetch file: {exc}")
+        record_error(exc)
+        logger.error(f"Streaming pipeline failed: {exc}")
+        status_code = 503 if isinstance(exc, PoolSaturatedError) else 500
+        yield _event("error", status_code=status_code, detail=str(exc))
+
+
+async def _stream_ocr_pages(
+    path: str,
+    page_numbers: List[int],
+    pages: List[PageExtraction],
+) -> AsyncIterator[str]:
+    """OCR each page as its own CPU job; yield page events in completion order."""
+    page_count = len(page_numbers)
+    slots = asyncio.Semaphore(STREAM_MAX_PAGE_JOBS)
+
+    async def run_page(page_no: int) -> tuple[int, Optional[PageExtraction], Optional[Exception]]:
+        async with slots:
+            try:
+                return page_no, await run_cpu(ocr_pdf_page, path, page_no), None
+            except Exception as exc:
+                return page_no, None, exc
+
+    yield _event("progress", stage="ocr", pages_done=0, pages_total=page_count)
+    tasks = [asyncio.create_task(run_page(n)) for n in page_numbers]
+    done = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            page_no, page, exc = await next_done
+            done += 1
+            if page is not None:
+                pages.append(page)
+                yield _page_event(page_no, page)
+            else:
+                record_error(exc)
+                logger.warning(f"Page {page_no} failed: {exc}")
+                yield _event("page_error", page=page_no, detail=str(exc))
+            yield _event("progress", stage="ocr", pages_done=done, pages_total=page_count)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# ---------------------------------------------------------------------------
+# Batch endpoint — many files / URLs, results streamed as NDJSON
+# ---------------------------------------------------------------------------
+
+@app.post(
+    "/process-documents",
+    tags=["processing"],
+    summary="Extract transactions from many documents in one request",
+)
+async def process_documents_batch(
+    files: List[UploadFile] = File(default=[]),
+    file_urls: List[str] = Form(default=[]),
+    user_id: Optional[str] = Form(default=None),
+    bank_name: Optional[str] = Form(default=None),
+    table_engine: Optional[str] = Form(default=None),
+):
+    """
+    Process several documents (multipart `files` and/or repeated `file_urls`
+    fields) with at most BATCH_MAX_CONCURRENCY in flight.
+
+    Streams one NDJSON line per document as soon as it finishes — in completion
+    order, tagged with its `index` in the request — then a final summary line.
+    A failing document yields an error line; it never fails the batch.
+    """
+    engine = _table_engine(table_engine)
+    items = [(f, None) for f in files] + [(None, u) for u in file_urls]
+    if not items:
+        raise HTTPException(
+            status_code=422,
+            detail="Provide at least one 'files' multipart field or 'file_urls' form field.",
+        )
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(items)} documents exceeds the limit of {BATCH_MAX_ITEMS}.",
+        )
+
+    logger.info(f"Batch of {len(items)} documents (concurrency={BATCH_MAX_CONCURRENCY})")
+    return StreamingResponse(
+        _stream_batch(items, bank_name, engine),
+        media_type="application/x-ndjson",
+    )
+
 
-    return await _run_pipeline(data, body.file_url, body.bank_name)
+async def _stream_batch(
+    items: List[tuple[Optional[UploadFile], Optional[str]]],
+    bank_name: Optional[str],
+    table_engine: str,
+) -> AsyncIterator[str]:
+    """Run every item through _resolve_input/_run_pipeline; yield results as they complete."""
+    slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run_item(index: int, file: Optional[UploadFile], file_url: Optional[str]) -> dict:
+        source = file.filename if file is not None else file_url
+        async with slots:
+            try:
+                data, source = await _resolve_input(file, file_url)
+                result = await _run_pipeline(data, source, bank_name, table_engine=table_engine)
+                return {"index": index, "source": source, "status": "ok", "result": jsonable_encoder(result)}
+            except HTTPException as exc:
+                record_error(exc)
+                return {"index": index, "source": source, "status": "error",
+                        "status_code": exc.status_code, "detail": exc.detail}
+            except Exception as exc:
+                record_error(exc)
+                logger.error(f"Batch item {index} ('{source}') failed: {exc}")
+                status_code = 503 if isinstance(exc, PoolSaturatedError) else 500
+                return {"index": index, "source": source, "status": "error",
+                        "status_code": status_code, "detail": str(exc)}
+
+    tasks = [asyncio.create_task(run_item(i, f, u)) for i, (f, u) in enumerate(items)]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            succeeded += item["status"] == "ok"
+            yield json.dumps(item) + "\n"
+        yield json.dumps({
+            "done": True,
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+        }) + "\n"
+    finally:
+        # Client went away mid-stream → stop the remaining work
+        for task in tasks:
+            task.cancel()
 
 
 # ---------------------------------------------------------------------------
-# Global exception handler
+# Global exception handlers
 # ---------------------------------------------------------------------------
 
+@app.exception_handler(StarletteHTTPException)
+async def counted_http_exception_handler(request: Request, exc: StarletteHTTPException):
+    record_error(exc)
+    return await http_exception_handler(request, exc)
+
+
+@app.exception_handler(RequestValidationError)
+async def counted_validation_exception_handler(request: Request, exc: RequestValidationError):
+    record_error(exc)
+    return await request_validation_exception_handler(request, exc)
+
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    record_error(exc)
+    logger.warning(f"Rejecting request: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Service busy", "detail": str(exc)},
+        headers={"Retry-After": "5"},
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
+    record_error(exc)
     logger.error(f"Unhandled exception: {traceback.format_exc()}")
     return JSONResponse(
         status_code=500,
@@ -367,10 +589,15 @@ async def _resolve_input(
     file: Optional[UploadFile],
     file_url: Optional[str],
 ) -> tuple[bytes, str]:
-    """Resolve either a multipart file or a URL to raw bytes."""
+    """
+    Resolve either a multipart file or a URL to raw bytes. Both are bounded by
+    FILE_SIZE_LIMIT_MB (413) without buffering an oversized body.
+    """
     if file is not None:
-        data = await file.read()
-        validate_file_size(data)
+        try:
+            data = await read_upload(file)
+        except FileTooLargeError as exc:
+            raise HTTPException(status_code=413, detail=str(exc))
         return data, file.filename or "upload"
 
     if file_url:
@@ -379,6 +606,8 @@ async def _resolve_input(
             return data, file_url
         except asyncio.TimeoutError:
             raise HTTPException(status_code=504, detail="Timeout fetching document from URL")
+        except FileTooLargeError as exc:
+            raise HTTPException(status_code=413, detail=str(exc))
         except Exception as exc:
             raise HTTPException(status_code=400, detail=f"Could not fetch file: {exc}")
 
@@ -388,50 +617,80 @@ async def _resolve_input(
     )
 
 
+def _table_engine(value: Optional[str]) -> str:
+    """Validate a per-request table engine; None → TABLE_ENGINE."""
+    if value is None or value == "":
+        return TABLE_ENGINE
+    engine = value.lower()
+    if engine not in TABLE_ENGINES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown table_engine '{value}'. Use one of: {', '.join(TABLE_ENGINES)}.",
+        )
+    return engine
+
+
+def _pipeline_version(table_engine: str = TABLE_ENGINE) -> str:
+    """
+    Result-cache version: LLM-corrected output differs from regex-only output,
+    each OCR preprocessing profile can read a scan differently, and the table
+    engines can split a statement's rows differently — as can an edited
+    BANK_LAYOUTS_FILE.
+    """
+    version = f"{PIPELINE_VERSION}+ocr={OCR_PROFILE}+tables={table_engine}"
+    layouts = layouts_version()
+    if layouts:
+        version = f"{version}+layouts={layouts}"
+    llm = LLM_ENABLED and bool(LLM_API_KEY)
+    return f"{version}+llm={llm_version()}" if llm else version
+
+
 async def _run_pipeline(
     data: bytes,
     source_name: str,
     bank_name: Optional[str],
+    response: Optional[Response] = None,
+    table_engine: str = TABLE_ENGINE,
 ) -> ProcessResponse:
-    """Run the full extraction → normalization pipeline."""
+    """
+    Run the full extraction → normalization pipeline, serving repeat uploads
+    of the same document from the result cache. Sets X-Cache on `response`.
+    """
     file_type = detect_file_type(data)
     logger.info(f"Processing '{source_name}' | type={file_type} | size={len(data)} bytes")
+    DOCUMENT_BYTES.observe(len(data), type=file_type)
+
+    key = cache_key(data, "process-document", _pipeline_version(table_engine), bank_name)
+    cached = await run_io(result_cache.get, key)
+    if cached is not None:
+        logger.info(f"Result cache HIT for '{source_name}' ({key[:12]})")
+        if response is not None:
+            response.headers["X-Cache"] = "HIT"
+        return ProcessResponse(**cached)
+    if response is not None:
+        response.headers["X-Cache"] = "MISS"
+
+    processed = await _process(data, file_type, table_engine, bank_name)
+    if processed.transactions:
+        await run_io(result_cache.put, key, jsonable_encoder(processed))
+    return processed
 
-    result: NormalizeResult
-    pages_processed = 0
-    extraction_method = "regex"
+
+async def _process(
+    data: bytes,
+    file_type: str,
+    table_engine: str = TABLE_ENGINE,
+    bank_name: Optional[str] = None,
+) -> ProcessResponse:
+    """Extraction → normalization → optional LLM phase for one document."""
 
     if is_image_type(file_type):
         # ── Image path ─────────────────────────────────────────────────────
-        raw_text = extract_text_from_image(data)
-        result = normalize_text(raw_text)
-        pages_processed = 1
-        extraction_method = "ocr"
+        extraction = await run_cpu(extract_image, data)
 
     elif is_pdf_type(file_type):
-        # ── PDF path ────────────────────────────────────────────────────────
-        pdf_result = parse_pdf(data)
-        pages_processed = len(pdf_result.pages)
-
-        if pdf_result.is_scanned:
-            # Scanned PDF → render pages → OCR
-            logger.info("Scanned PDF detected — running per-page OCR")
-            page_images = pdf_pages_to_images(data)
-            raw_text = extract_text_from_images(page_images)
-            result = normalize_text(raw_text)
-            extraction_method = "ocr"
-
-        else:
-            # Text PDF → try table extraction first
-            table_rows = extract_tables(data)
-            if table_rows:
-                logger.info(f"Using Camelot table rows ({len(table_rows)} rows)")
-                result = normalize_table_rows(table_rows)
-                extraction_method = "camelot"
-            else:
-                logger.info("No tables found — falling back to text normalization")
-                result = normalize_text(pdf_result.full_text)
-                extraction_method = "pdfplumber"
+        # ── PDF path (text, tables or scanned — one shared document session) ──
+        extraction = await run_cpu(extract_pdf, data, table_engine, bank_name)
 
     else:
         raise HTTPException(
@@ -439,29 +698,48 @@ async def _run_pipeline(
             detail=f"Unsupported file type '{file_type}'. Send a PDF or image.",
         )
 
+    return await _finalize(extraction)
+
+
+async def _finalize(extraction: ExtractionResult) -> ProcessResponse:
+    """Running-balance check, the optional LLM phase where it fails, then build the response."""
+    result = extraction.result
+    pages_processed = extraction.pages_processed
+    extraction_method = extraction.extraction_method
+    check = reconcile(result.transactions)
+
     # ── Optional LLM normalization (Phase 2) ──────────────────────────────
-    if result.transactions:
-        raw_for_llm = (
-            "\n".join(p.text for p in pdf_result.pages)
-            if is_pdf_type(file_type) and not locals().get("raw_text")
-            else locals().get("raw_text", "")
-        )
-        corrected = await llm_normalize(raw_for_llm, result.transactions)
+    # Skipped when the balances reconcile; only the broken rows' chunks go
+    # out when they do not; everything goes out when there is nothing to check.
+    if result.transactions and not check.trusted:
+        rows = check.broken if check.checked else None
+        corrected = await llm_normalize(extraction.raw_text, result.transactions, rows)
         if corrected != result.transactions:
-            result.transactions = corrected
-            extraction_method += "+llm"
+            corrected_check = reconcile(corrected)
+            if check.better_than(corrected_check):
+                logger.warning("LLM result reconciles worse than the regex parse — discarding it")
+            else:
+                result.transactions = corrected
+                check = corrected_check
+                extraction_method += "+llm"
+    elif check.trusted and LLM_ENABLED and LLM_API_KEY:
+        logger.info(f"Balances reconcile ({check.checked} steps) — skipping the LLM phase")
 
     logger.info(
         f"Pipeline complete — {len(result.transactions)} transactions "
-        f"| confidence={result.confidence} | method={extraction_method}"
+        f"| confidence={result.confidence} | consistency={check.score} | method={extraction_method}"
     )
 
     if not result.transactions:
         logger.warning("No transactions extracted — returning empty result")
+    EXTRACTIONS.inc(method=extraction_method)
+    PAGES.observe(pages_processed)
 
     return ProcessResponse(
         transactions=[Transaction(**t.to_dict()) for t in result.transactions],
         confidence=result.confidence,
         pages_processed=pages_processed,
         extraction_method=extraction_method,
+        consistency=check.score,
+        unreconciled_rows=check.broken,
     )
@@ -0,0 +1,296 @@
+"""
+metrics.py — Counters, gauges and latency histograms served on /metrics.
+
+A small in-process registry rendered in the Prometheus text exposition
+format (no client library needed). What is measured:
+
+  * Requests    — count, latency and status per endpoint (MetricsMiddleware),
+                  plus requests in flight
+  * Stages      — latency per pipeline stage (parse_pdf, extract_tables_*,
+                  render_page, ocr_page, normalize_*, llm_normalize,
+                  gemini_http, ...), recorded with timed() / stage()
+  * Documents   — size, pages processed and extraction_method of each result
+  * Errors      — count per exception type
+  * Pools / cache — sampled from their stats at scrape time
+
+Most stages run in the CPU pool's worker processes, whose registries nobody
+scrapes. There, observations go to a per-job buffer instead; the executor
+runs each job through run_collecting_stages(), the buffer travels back with
+the result (or the exception), and the API process records it.
+
+Recording is a perf_counter() pair, a bisect and a dict update under an
+uncontended lock — microseconds against stages that take milliseconds.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+from abc import ABC, abstractmethod
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_SIZE_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+_PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+# ---------------------------------------------------------------------------
+# Metric types
+# ---------------------------------------------------------------------------
+
+_registry: List["_Metric"] = []
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines of this metric, without the HELP / TYPE header."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, /, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._label_text(key)} {_number(v)}" for key, v in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, /, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, /, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = _LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key → [per-bucket counts (last = +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, /, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# The service's metrics
+# ---------------------------------------------------------------------------
+
+REQUESTS = Counter("docservice_requests_total", "HTTP requests by endpoint, method and status.",
+                   ("endpoint", "method", "status"))
+REQUEST_SECONDS = Histogram("docservice_request_duration_seconds",
+                            "Request latency, to the last body byte (streams included).", ("endpoint",))
+IN_FLIGHT = Gauge("docservice_requests_in_flight", "Requests being served right now.")
+IN_FLIGHT.set(0)
+STAGE_SECONDS = Histogram("docservice_stage_duration_seconds", "Latency of one pipeline stage call.",
+                          ("stage",), buckets=_STAGE_BUCKETS)
+EXTRACTIONS = Counter("docservice_extractions_total", "Processed documents by extraction_method.", ("method",))
+PAGES = Histogram("docservice_document_pages", "Pages processed per document.", buckets=_PAGE_BUCKETS)
+DOCUMENT_BYTES = Histogram("docservice_document_bytes", "Size of received documents.", ("type",),
+                           buckets=_SIZE_BUCKETS)
+ERRORS = Counter("docservice_errors_total", "Errors by exception type.", ("type",))
+GEMINI_RESPONSES = Counter("docservice_gemini_responses_total", "Gemini HTTP attempts by status.", ("status",))
+POOL_STATS = Gauge("docservice_pool", "Worker pool size, queued / active jobs and totals (sampled at scrape).",
+                   ("pool", "stat"))
+RESULT_CACHE_STATS = Gauge("docservice_result_cache", "Result cache entries, bytes and counters (sampled at scrape).",
+                           ("stat",))
+
+
+def record_error(exc: BaseException) -> None:
+    ERRORS.inc(type=type(exc).__name__)
+
+
+# ---------------------------------------------------------------------------
+# Stage timing
+# ---------------------------------------------------------------------------
+
+# Set only inside a CPU-pool worker while a job runs: (stage, seconds) pairs
+# to ship back to the API process. A worker runs one job at a time, so one
+# process-wide buffer serves the job's threads (e.g. per-page OCR) as well.
+_job_stages: Optional[List[Tuple[str, float]]] = None
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    buffer = _job_stages
+    if buffer is not None:
+        buffer.append((name, seconds))
+    else:
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as one call of stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def timed(name: str) -> Callable:
+    """Decorator: time every call of a function (sync or async) as stage `name`."""
+    def decorate(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    observe_stage(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe_stage(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def run_collecting_stages(fn: Callable, *args, **kwargs) -> Tuple[object, List[Tuple[str, float]]]:
+    """
+    Worker-side job wrapper: (fn's result, its stage timings). On failure the
+    timings ride along on the exception as `stage_timings`.
+    """
+    global _job_stages
+    _job_stages = stages = []
+    try:
+        return fn(*args, **kwargs), stages
+    except BaseException as exc:
+        exc.stage_timings = stages
+        raise
+    finally:
+        _job_stages = None
+
+
+def record_stages(stages: Sequence[Tuple[str, float]]) -> None:
+    """API-side: record timings a worker job sent back."""
+    for name, seconds in stages:
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+
+# ---------------------------------------------------------------------------
+# Request middleware
+# ---------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: request count, latency and status per endpoint.
+    The endpoint is the matched route's path (unmatched paths share one
+    label, so probing random URLs cannot grow the label set).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUESTS.inc(endpoint=endpoint, method=scope["method"], status=status)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
@@ -0,0 +1,144 @@
+"""
+native_tables.py — Table rows from geometry the text-layer parse already has.
+
+A Ghostscript-free alternative to Camelot:
+  * Ruled pages      — pdfplumber's extract_tables() rows, computed during
+                       parse_pdf and kept in ParsedPage.table_data (free)
+  * Whitespace pages — rows rebuilt from PyMuPDF word boxes: words are
+                       grouped into lines by baseline, split into cells at
+                       wide gaps, and cells are snapped to column bands
+                       (the x-ranges covered by cells across the page), so
+                       an empty Debit or Credit cell stays an empty column
+
+Output has the same shape as table_extractor.extract_tables (a list of
+string rows in page order) and goes straight into normalize_table_rows.
+"""
+
+from __future__ import annotations
+
+from statistics import median
+from typing import Dict, List, Optional, Tuple
+
+from app.document import DocumentSession
+from app.metrics import timed
+from app.pdf_parser import PdfParseResult
+from app.utils import setup_logger
+
+logger = setup_logger("native-tables")
+
+# A gap wider than this many word-heights separates two cells
+_CELL_GAP = 1.2
+# Lines with fewer cells do not shape the column bands (titles, footers)
+_MIN_CELLS = 3
+
+# (x0, x1, text)
+_Cell = Tuple[float, float, str]
+
+
+@timed("extract_native_tables")
+def extract_native_tables(
+    doc: DocumentSession,
+    parsed: PdfParseResult,
+    pages: Optional[Dict[int, str]] = None,
+) -> List[List[str]]:
+    """
+    Table rows for the candidate `pages` (page → "lattice" | "stream", see
+    table_extractor.candidate_pages; None = every page).
+    Lattice pages reuse pdfplumber's rows; stream pages, and lattice pages
+    without them, are rebuilt from word geometry.
+    """
+    if pages is None:
+        pages = {i: "stream" for i in range(1, doc.page_count + 1)}
+    parsed_pages = {p.page_number: p for p in parsed.pages}
+
+    rows: List[List[str]] = []
+    for page_no in sorted(pages):
+        parsed_page = parsed_pages.get(page_no)
+        if pages[page_no] == "lattice" and parsed_page is not None and parsed_page.table_data:
+            page_rows = [[cell.strip() for cell in row] for row in parsed_page.table_data]
+        else:
+            page_rows = _rows_from_words(doc, page_no)
+        rows.extend(row for row in page_rows if any(row))
+
+    logger.info(f"Native table engine extracted {len(rows)} rows from {len(pages)} pages")
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Word geometry → rows
+# ---------------------------------------------------------------------------
+
+def _rows_from_words(doc: DocumentSession, page_no: int) -> List[List[str]]:
+    with doc.locked():
+        words = doc.fitz_doc[page_no - 1].get_text("words")
+    if not words:
+        return []
+
+    height = median(w[3] - w[1] for w in words) or 1.0
+    lines = [_split_cells(line, height * _CELL_GAP) for line in _group_lines(words, height)]
+
+    bands = _column_bands([line for line in lines if len(line) >= _MIN_CELLS])
+    if len(bands) < _MIN_CELLS:
+        return []
+
+    rows = []
+    for line in lines:
+        row = [""] * len(bands)
+        for x0, x1, text in line:
+            col = _band_index(bands, (x0 + x1) / 2)
+            row[col] = f"{row[col]} {text}".strip()
+        rows.append(row)
+    return rows
+
+
+def _group_lines(words, height: float) -> List[List[tuple]]:
+    """Group words whose vertical centres lie within half a word-height."""
+    by_centre = sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0]))
+    lines: List[List[tuple]] = []
+    current: List[tuple] = []
+    centre = None
+    for w in by_centre:
+        c = (w[1] + w[3]) / 2
+        if centre is not None and c - centre > height / 2:
+            lines.append(current)
+            current = []
+        if not current:
+            centre = c
+        current.append(w)
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _split_cells(line: List[tuple], gap: float) -> List[_Cell]:
+    cells: List[_Cell] = []
+    for w in sorted(line, key=lambda w: w[0]):
+        x0, x1, text = w[0], w[2], w[4]
+        if cells and x0 - cells[-1][1] <= gap:
+            px0, _, ptext = cells[-1]
+            cells[-1] = (px0, x1, f"{ptext} {text}")
+        else:
+            cells.append((x0, x1, text))
+    return cells
+
+
+def _column_bands(lines: List[List[_Cell]]) -> List[Tuple[float, float]]:
+    """Union of the x-ranges of all cells — each connected range is one column."""
+    spans = sorted((x0, x1) for line in lines for x0, x1, _ in line)
+    bands: List[Tuple[float, float]] = []
+    for x0, x1 in spans:
+        if bands and x0 <= bands[-1][1]:
+            bands[-1] = (bands[-1][0], max(bands[-1][1], x1))
+        else:
+            bands.append((x0, x1))
+    return bands
+
+
+def _band_index(bands: List[Tuple[float, float]], x: float) -> int:
+    """Band containing x, or the nearest one (cells of short lines may fall in a gutter)."""
+    best, best_dist = 0, float("inf")
+    for i, (x0, x1) in enumerate(bands):
+        dist = 0.0 if x0 <= x <= x1 else min(abs(x - x0), abs(x - x1))
+        if dist < best_dist:
+            best, best_dist = i, dist
+    return best
@@ -17,13 +17,19 @@ Output schema per transaction:
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import os
 import re
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Optional, Tuple
 
+from app.gemini import gemini_post
+from app.layouts import ColumnLayout, resolve_layout
+from app.metrics import stage, timed
 from app.utils import setup_logger
 
 logger = setup_logger("normalizer")
@@ -67,23 +73,71 @@ _DATE_PATTERNS: List[Tuple[re.Pattern, str]] = [
     (re.compile(r"\b(\d{2}[/\-]\d{2}[/\-]\d{2})\b"), "%d-%m-%y"),
 ]
 
+# All of _DATE_PATTERNS in one scanner, so each line is searched once instead
+# of up to five times. The alternatives share their leading "\b\d" (written
+# as "\d(?<!\w.)" so the regex engine can skip ahead to candidate characters)
+# and are named d<k> after the _DATE_PATTERNS index they mirror — keep the two
+# in sync. At any start position at most one of the patterns can match, which
+# is what lets _scan_dates() recover every pattern's leftmost match.
+_MONTHS_ALT = "Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec"
+_DATE_SCAN_RE = re.compile(
+    r"(?i:\d(?<!\w.)(?:"
+    r"(?P<d0>\d{3}-\d{2}-\d{2}\b)"
+    r"|(?P<d1>\d[/\-]\d{2}[/\-]\d{4}\b)"
+    r"|(?P<d2>\d?\s+(?:" + _MONTHS_ALT + r")[a-z]*\s+\d{4}\b)"
+    r"|(?P<d4>\d[/\-]\d{2}[/\-]\d{2}\b)"
+    r")"
+    r"|[JFMASOND](?<!\w.)[a-z]{2}(?<=" + _MONTHS_ALT + r")(?P<d3>[a-z]*\s+\d{1,2},?\s+\d{4}\b))"
+)
+_WORD_START_RE = re.compile(r"(?<!\w)\w")
+
 _MONTH_MAP = {m: str(i).zfill(2) for i, m in enumerate(
     ["jan","feb","mar","apr","may","jun","jul","aug","sep","oct","nov","dec"], 1
 )}
 
+_DMY4_RE = re.compile(r"^(\d{2})[/\-](\d{2})[/\-](\d{4})$")
+_DMY2_RE = re.compile(r"^(\d{2})[/\-](\d{2})[/\-](\d{2})$")
+_D_MON_Y_RE = re.compile(r"^(\d{1,2})\s+([A-Za-z]+)\s+(\d{4})$")
+_MON_D_Y_RE = re.compile(r"^([A-Za-z]+)\s+(\d{1,2}),?\s+(\d{4})$")
+
 
+def _scan_dates(text: str) -> List[Optional[str]]:
+    """
+    First (leftmost) match of each _DATE_PATTERNS entry in `text`, in pattern
+    order — the same strings `pattern.search(text).group(1)` would return.
+    """
+    found: List[Optional[str]] = [None] * len(_DATE_PATTERNS)
+    for m in _DATE_SCAN_RE.finditer(text):
+        _record_date(found, m)
+        # finditer() resumes after a match, but another pattern can start inside
+        # it (e.g. "01-31-2025" within "2024-01-31-2025"): probe those word starts.
+        for w in _WORD_START_RE.finditer(text, m.start() + 1, m.end()):
+            inner = _DATE_SCAN_RE.match(text, w.start())
+            if inner:
+                _record_date(found, inner)
+    return found
+
+
+def _record_date(found: List[Optional[str]], m: re.Match) -> None:
+    k = int(m.lastgroup[1:])
+    if found[k] is None:
+        found[k] = m.group(0)
+
+
+# Statements repeat the same few dozen dates — parse each distinct string once
+@lru_cache(maxsize=4096)
 def _parse_date(raw: str) -> Optional[str]:
     """Try to parse a date string and return ISO YYYY-MM-DD or None."""
     raw = raw.strip()
     # DD/MM/YYYY or DD-MM-YYYY (4-digit year)
-    m = re.match(r"^(\d{2})[/\-](\d{2})[/\-](\d{4})$", raw)
+    m = _DMY4_RE.match(raw)
     if m:
         try:
             return f"{m.group(3)}-{m.group(2)}-{m.group(1)}"
         except Exception:
             pass
     # DD/MM/YY or DD-MM-YY (2-digit year — e.g. 01-01-26)
-    m = re.match(r"^(\d{2})[/\-](\d{2})[/\-](\d{2})$", raw)
+    m = _DMY2_RE.match(raw)
     if m:
         try:
             # Use strptime to handle century correctly (2000s vs 1900s)
@@ -92,13 +146,13 @@ def _parse_date(raw: str) -> Optional[str]:
         except Exception:
             pass
     # DD MMM YYYY
-    m = re.match(r"^(\d{1,2})\s+([A-Za-z]+)\s+(\d{4})$", raw)
+    m = _D_MON_Y_RE.match(raw)
     if m:
         mon = _MONTH_MAP.get(m.group(2).lower()[:3])
         if mon:
             return f"{m.group(3)}-{mon}-{m.group(1).zfill(2)}"
     # MMM DD, YYYY
-    m = re.match(r"^([A-Za-z]+)\s+(\d{1,2}),?\s+(\d{4})$", raw)
+    m = _MON_D_Y_RE.match(raw)
     if m:
         mon = _MONTH_MAP.get(m.group(1).lower()[:3])
         if mon:
@@ -120,6 +174,9 @@ _AMOUNT_RE = re.compile(
     r"(?:₹|INR|Rs\.?|USD|\$|£|€|EUR)?\s*"
     r"([\d,]+(?:\.\d{1,2})?)"
 )
+# Same shape as _AMOUNT_RE without the group — used to blank amounts out of descriptions
+_AMOUNT_STRIP_RE = re.compile(r"(?:₹|INR|Rs\.?|USD|\$|£|€|EUR)?\s*[\d,]+(?:\.\d{1,2})?")
+_MULTI_SPACE_RE = re.compile(r"\s{2,}")
 _CR_MARKERS = re.compile(r"\b(cr|credit|received|deposit|refund|reversal)\b", re.I)
 _DR_MARKERS = re.compile(r"\b(dr|debit|paid|payment|purchase|withdraw|fee|charge)\b", re.I)
 # UPI reference markers — strongest signal (e.g. UPI/DR/978584154770/...)
@@ -164,6 +221,7 @@ def _detect_type(row_text: str, amount_str: str = "") -> str:
 # Main normalizer — Phase 1: Regex
 # ---------------------------------------------------------------------------
 
+@timed("normalize_text")
 def normalize_text(text: str) -> NormalizeResult:
     """
     Parse raw text (from PDF or OCR) into structured transactions.
@@ -175,20 +233,47 @@ def normalize_text(text: str) -> NormalizeResult:
     return NormalizeResult(transactions=transactions, confidence=confidence)
 
 
-def normalize_table_rows(rows: List[List[str]]) -> NormalizeResult:
+def merge_results(results: List[NormalizeResult], total_lines: int) -> NormalizeResult:
+    """
+    Concatenate per-page results (in the given order) and score them as one
+    document. `total_lines` is the non-empty line count of all pages' text.
+    """
+    transactions = [t for r in results for t in r.transactions]
+    confidence = _compute_confidence(transactions, total_lines)
+    return NormalizeResult(transactions=transactions, confidence=confidence)
+
+
+def count_lines(text: str) -> int:
+    """Number of non-empty lines — the denominator normalize_text() scores against."""
+    return sum(1 for l in text.splitlines() if l.strip())
+
+
+@timed("normalize_table_rows")
+def normalize_table_rows(rows: List[List[str]], bank_name: Optional[str] = None) -> NormalizeResult:
     """
-    Parse structured table rows (from Camelot) into transactions.
-    Column heuristics: try to identify date / description / amount / balance columns.
+    Parse structured table rows (from Camelot or the native engine) into transactions.
+    Column heuristics: try to identify date / description / amount / balance columns —
+    resolved once per header layout (and bank) by the layout registry, which
+    also applies per-bank overrides.
     """
     if not rows:
         return NormalizeResult()
 
     header, data_rows = _detect_header(rows)
-    transactions = _parse_table_rows(data_rows, header)
+    transactions = _parse_table_rows(data_rows, resolve_layout(header, bank_name))
     confidence = _compute_confidence(transactions, len(data_rows))
     return NormalizeResult(transactions=transactions, confidence=confidence)
 
 
+@timed("normalize_table_frames")
+def normalize_table_frames(frames: list, bank_name: Optional[str] = None) -> NormalizeResult:
+    """
+    normalize_table_rows() straight from Camelot's per-table DataFrames
+    (cells are stripped and fully-empty rows dropped, like extract_tables()).
+    """
+    return normalize_table_rows(table_frame_rows(frames), bank_name)
+
+
 # ---------------------------------------------------------------------------
 # Line parser
 # ---------------------------------------------------------------------------
@@ -204,7 +289,8 @@ def _parse_lines(lines: List[str]) -> List[Transaction]:
     """
     transactions: List[Transaction] = []
     for line in lines:
-        date_val = _extract_date_from_line(line)
+        found_dates = _scan_dates(line)
+        date_val = _first_parsed_date(found_dates)
         if date_val is None:
             continue   # no date → probably a header or noise
         amounts = _AMOUNT_RE.findall(line)
@@ -245,7 +331,7 @@ def _parse_lines(lines: List[str]) -> List[Transaction]:
                         tx_type = "credit"
                     elif col_idx == len(mid) - 1 and len(mid) >= 2:
                         tx_type = "debit"
-                desc = _strip_date_amounts(line)
+                desc = _strip_date_amounts(line, found_dates)
                 transactions.append(Transaction(
                     date=date_val,
                     description=desc[:120],
@@ -266,7 +352,7 @@ def _parse_lines(lines: List[str]) -> List[Transaction]:
         if amount <= 0:
             continue  # skip zero/negative amounts
 
-        desc = _strip_date_amounts(line)
+        desc = _strip_date_amounts(line, found_dates)
         tx_type = _detect_type(line)
         transactions.append(Transaction(
             date=date_val,
@@ -279,22 +365,32 @@ def _parse_lines(lines: List[str]) -> List[Transaction]:
 
 
 def _extract_date_from_line(line: str) -> Optional[str]:
-    for pattern, _ in _DATE_PATTERNS:
-        m = pattern.search(line)
-        if m:
-            parsed = _parse_date(m.group(1))
+    return _first_parsed_date(_scan_dates(line))
+
+
+def _first_parsed_date(found_dates: List[Optional[str]]) -> Optional[str]:
+    """Parse the per-pattern matches in priority order; first one that parses wins."""
+    for raw in found_dates:
+        if raw is not None:
+            parsed = _parse_date(raw)
             if parsed:
                 return parsed
     return None
 
 
-def _strip_date_amounts(line: str) -> str:
+def _strip_date_amounts(line: str, found_dates: Optional[List[Optional[str]]] = None) -> str:
     """Remove dates and amounts from a line to get the description."""
+    found = found_dates if found_dates is not None else _scan_dates(line)
     cleaned = line
-    for pattern, _ in _DATE_PATTERNS:
+    for k, (pattern, _) in enumerate(_DATE_PATTERNS):
+        if found[k] is None:
+            continue    # no match in the current string → sub() would be a no-op
         cleaned = pattern.sub("", cleaned)
-    cleaned = re.sub(r"(?:₹|INR|Rs\.?|USD|\$|£|€|EUR)?\s*[\d,]+(?:\.\d{1,2})?", "", cleaned)
-    cleaned = re.sub(r"\s{2,}", " ", cleaned).strip(" ,-|/")
+        # Patterns are applied in sequence, so a removal can expose a new match
+        # for a later pattern: rescan what is left.
+        found = _scan_dates(cleaned)
+    cleaned = _AMOUNT_STRIP_RE.sub("", cleaned)
+    cleaned = _MULTI_SPACE_RE.sub(" ", cleaned).strip(" ,-|/")
     return cleaned or "Transaction"
 
 
@@ -313,34 +409,14 @@ def _detect_header(rows: List[List[str]]) -> Tuple[Optional[List[str]], List[Lis
     return None, rows
 
 
-_COL_HINTS = {
-    "date": ["date", "txn date", "value date", "transaction date"],
-    "desc": ["description", "particulars", "narration", "details", "remarks"],
-    "debit": ["debit", "dr", "withdrawal", "payment"],
-    "credit": ["credit", "cr", "deposit", "received"],
-    "balance": ["balance", "closing balance", "bal"],
-    "amount": ["amount", "txn amount"],
-}
-
-
-def _col_index(header: Optional[List[str]], hints: List[str]) -> Optional[int]:
-    if not header:
-        return None
-    for i, h in enumerate(header):
-        for hint in hints:
-            if hint in h:
-                return i
-    return None
-
-
-def _parse_table_rows(rows: List[List[str]], header: Optional[List[str]]) -> List[Transaction]:
+def _parse_table_rows(rows: List[List[str]], layout: ColumnLayout) -> List[Transaction]:
     transactions: List[Transaction] = []
-    date_col = _col_index(header, _COL_HINTS["date"])
-    desc_col = _col_index(header, _COL_HINTS["desc"])
-    debit_col = _col_index(header, _COL_HINTS["debit"])
-    credit_col = _col_index(header, _COL_HINTS["credit"])
-    amount_col = _col_index(header, _COL_HINTS["amount"])
-    bal_col = _col_index(header, _COL_HINTS["balance"])
+    date_col = layout.date
+    desc_col = layout.desc
+    debit_col = layout.debit
+    credit_col = layout.credit
+    amount_col = layout.amount
+    bal_col = layout.balance
 
     for row in rows:
         if len(row) < 2:
@@ -392,12 +468,22 @@ def _parse_table_rows(rows: List[List[str]], header: Optional[List[str]]) -> Lis
     return transactions
 
 
+def table_frame_rows(frames: list) -> List[List[str]]:
+    """Stripped, non-empty rows of Camelot table DataFrames (no per-row Series)."""
+    rows: List[List[str]] = []
+    for df in frames:
+        for row in df.to_numpy(dtype=object).tolist():
+            cleaned_row = [str(cell).strip() for cell in row]
+            if any(cleaned_row):
+                rows.append(cleaned_row)
+    return rows
+
+
 def _extract_date_from_row(row: List[str]) -> str:
     for cell in row:
-        for pat, _ in _DATE_PATTERNS:
-            m = pat.search(cell)
-            if m:
-                return m.group(1)
+        for raw in _scan_dates(cell):
+            if raw is not None:
+                return raw
     return ""
 
 
@@ -421,57 +507,223 @@ def _compute_confidence(transactions: List[Transaction], total_lines: int) -> fl
 # ---------------------------------------------------------------------------
 # Phase 2: Optional LLM normalization (Gemini)
 # ---------------------------------------------------------------------------
+#
+# The raw text is split into chunks of at most LLM_CHUNK_CHARS, cut where a
+# new transaction line (one that carries a date) begins. Each chunk goes to
+# Gemini's REST API with the regex transactions found in it, all chunks
+# concurrently (app.gemini rate-limits and retries them). Whatever is not
+# back within LLM_TIMEOUT_S — and any chunk whose call or answer fails —
+# keeps its regex transactions, so the LLM phase can only replace rows
+# chunk by chunk, never lose a chunk. When the caller passes the rows that
+# break the running balance (app.reconcile), the other chunks are not sent.
 
 LLM_ENABLED = os.getenv("LLM_ENABLED", "false").lower() == "true"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-
-
-async def llm_normalize(raw_text: str, transactions: List[Transaction]) -> List[Transaction]:
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+# Hard deadline for the whole LLM phase of one document
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_CHUNK_CHARS = int(os.getenv("LLM_CHUNK_CHARS", "6000"))
+# Chunks of one document sent at once
+LLM_MAX_PARALLEL = int(os.getenv("LLM_MAX_PARALLEL", "4"))
+# A chunk is cut at the next dated line within this many lines past the size limit
+_CHUNK_LOOKAHEAD = 8
+
+
+def llm_version() -> str:
+    """Model, prompt and chunking that shape LLM output — part of the result-cache version."""
+    template = hashlib.sha256(_build_llm_prompt("", []).encode("utf-8")).hexdigest()[:8]
+    return f"{LLM_MODEL}:{template}:{LLM_CHUNK_CHARS}"
+
+
+async def llm_normalize(
+    raw_text: str,
+    transactions: List[Transaction],
+    rows: Optional[List[int]] = None,
+) -> List[Transaction]:
     """
     Send raw_text to Gemini and ask it to correct/augment the parsed transactions.
-    Falls back to original transactions on any error.
+    With `rows` (indices into `transactions`, e.g. the rows that break the
+    running balance) only the chunks holding those rows are sent.
+    Falls back to the original transactions per chunk on any error or timeout.
     Only called when LLM_ENABLED=true and GEMINI_API_KEY is set.
     """
     if not LLM_ENABLED or not GEMINI_API_KEY:
         return transactions
 
-    logger.info("LLM normalization enabled — calling Gemini")
-    prompt = _build_llm_prompt(raw_text, transactions)
+    chunks = _chunk_text(raw_text, LLM_CHUNK_CHARS)
+    if not chunks:
+        return transactions
+    parsed = _assign_transactions(chunks, transactions)
+    if rows is None:
+        send = list(range(len(chunks)))
+    else:
+        flagged = {id(transactions[i]) for i in rows}
+        send = [i for i, part in enumerate(parsed) if any(id(t) in flagged for t in part)]
+        if not send:
+            return transactions
+    logger.info(f"LLM normalization enabled — calling Gemini on {len(send)}/{len(chunks)} chunk(s)")
+
+    slots = asyncio.Semaphore(max(1, LLM_MAX_PARALLEL))
+
+    async def correct(chunk: str, chunk_parsed: List[Transaction]) -> List[Transaction]:
+        async with slots:
+            return await _llm_chunk(chunk, chunk_parsed)
+
+    tasks = {i: asyncio.ensure_future(correct(chunks[i], parsed[i])) for i in send}
+    try:
+        with stage("llm_normalize"):
+            done, pending = await asyncio.wait(tasks.values(), timeout=LLM_TIMEOUT_S)
+    finally:
+        for task in tasks.values():
+            task.cancel()       # past the deadline, or the request itself was cancelled
+    if pending:
+        logger.warning(f"LLM timed out after {LLM_TIMEOUT_S:.0f}s on {len(pending)} chunk(s) — using regex results there")
+
+    result: List[Transaction] = []
+    fallbacks = 0
+    for i in range(len(chunks)):
+        task = tasks.get(i)
+        if task is None:
+            result.extend(parsed[i])
+            continue
+        corrected = None
+        if task in done:
+            exc = task.exception()
+            if exc is None:
+                corrected = task.result()
+            else:
+                logger.error(f"LLM normalization failed on chunk {i + 1}/{len(chunks)}: {exc} — using regex results")
+        if corrected is None or (not corrected and parsed[i]):
+            corrected = parsed[i]
+            fallbacks += 1
+        result.extend(corrected)
+    logger.info(f"LLM returned {len(result)} transactions ({fallbacks}/{len(send)} chunks kept regex results)")
+    return result
+
+
+async def _llm_chunk(chunk: str, parsed: List[Transaction]) -> List[Transaction]:
+    """Corrected transactions for one chunk of text. Raises on any failure."""
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{LLM_MODEL}:generateContent?key={GEMINI_API_KEY}"
+    payload = {
+        "contents": [{"parts": [{"text": _build_llm_prompt(chunk, parsed)}]}],
+        "generationConfig": {
+            "temperature": 0,
+            "maxOutputTokens": 8192,
+            "responseMimeType": "application/json",
+        },
+    }
+    response = await gemini_post(url, payload, timeout=LLM_TIMEOUT_S)
+    if response.status_code != 200:
+        raise RuntimeError(f"Gemini API error {response.status_code}: {response.text[:200]}")
+    text = response.json()["candidates"][0]["content"]["parts"][0]["text"]
+    corrected = json.loads(_extract_json_from_llm(text))
+    if not isinstance(corrected, list):
+        raise ValueError(f"expected a JSON array, got {type(corrected).__name__}")
+    return [_llm_transaction(item) for item in corrected]
+
+
+def _llm_transaction(item: dict) -> Transaction:
+    """One LLM row as a Transaction; raises ValueError on a malformed row."""
+    if not isinstance(item, dict):
+        raise ValueError(f"expected a transaction object, got {type(item).__name__}")
+    date = _parse_date(str(item.get("date") or ""))
+    if date is None:
+        raise ValueError(f"bad date {item.get('date')!r}")
+    kind = str(item.get("type") or "").strip().lower()
+    if kind not in ("debit", "credit"):
+        raise ValueError(f"bad type {item.get('type')!r}")
+    amount = _llm_number(item.get("amount"))
+    if amount is None:
+        raise ValueError(f"missing amount in {item!r}")
+    return Transaction(
+        date=date,
+        description=str(item.get("description") or ""),
+        amount=abs(amount),
+        type=kind,
+        balance=_llm_number(item.get("balance")),
+    )
+
 
+def _llm_number(value) -> Optional[float]:
+    """A JSON number or numeric string ("1,200.50", "₹100") as float; None stays None."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"bad number {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if not text:
+        return None
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        raw_json = _extract_json_from_llm(response.text)
-        corrected = json.loads(raw_json)
-        result = []
-        for item in corrected:
-            result.append(Transaction(
-                date=item.get("date", ""),
-                description=item.get("description", ""),
-                amount=float(item.get("amount", 0)),
-                type=item.get("type", "debit"),
-                balance=item.get("balance"),
-            ))
-        logger.info(f"LLM returned {len(result)} transactions")
-        return result
-    except Exception as exc:
-        logger.error(f"LLM normalization failed: {exc} — using regex results")
-        return transactions
+        return float(text.replace(",", ""))
+    except ValueError:
+        parsed = _parse_amount(text)
+        if parsed is None:
+            raise ValueError(f"bad number {value!r}")
+        return parsed
+
+
+def _chunk_text(raw_text: str, max_chars: int) -> List[str]:
+    """Line-aligned chunks of about max_chars, each starting at a dated line where possible."""
+    lines = [line for line in raw_text.splitlines() if line.strip()]
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    overflow = 0
+    for line in lines:
+        if current and size + len(line) > max_chars:
+            # Over the limit: cut before the next line that starts a transaction
+            overflow += 1
+            if _extract_date_from_line(line) or overflow > _CHUNK_LOOKAHEAD:
+                chunks.append("\n".join(current))
+                current, size, overflow = [], 0, 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _assign_transactions(chunks: List[str], transactions: List[Transaction]) -> List[List[Transaction]]:
+    """
+    Split the (document-ordered) regex transactions over the chunks their
+    text appears in: by description, else by amount in this or the next
+    chunk, else they stay with the previous transaction's chunk.
+    """
+    if len(chunks) == 1:
+        return [list(transactions)]
+    flat = [" ".join(chunk.split()) for chunk in chunks]
+    assigned: List[List[Transaction]] = [[] for _ in chunks]
+    current = 0
+    for t in transactions:
+        snippet = " ".join(t.description.split())[:24]
+        found = None
+        if len(snippet) >= 6:
+            found = next((i for i in range(current, len(flat)) if snippet in flat[i]), None)
+        if found is None:
+            amounts = (f"{t.amount:,.2f}", f"{t.amount:.2f}")
+            found = next(
+                (i for i in range(current, min(current + 2, len(flat))) if any(a in flat[i] for a in amounts)),
+                None,
+            )
+        if found is not None:
+            current = found
+        assigned[current].append(t)
+    return assigned
 
 
 def _build_llm_prompt(raw_text: str, parsed: List[Transaction]) -> str:
-    parsed_preview = json.dumps([t.to_dict() for t in parsed[:5]], indent=2)
+    parsed_json = json.dumps([t.to_dict() for t in parsed], separators=(",", ":"))
     return f"""You are a financial data extraction assistant.
 
-Given the raw text from a bank statement and an initial parse, correct or complete the transaction list.
+Given a section of raw text from a bank statement and an initial parse of that section, correct or complete its transaction list.
 
-Raw text (first 2000 chars):
-{raw_text[:2000]}
+Raw text:
+{raw_text}
 
-Initial parse (first 5):
-{parsed_preview}
+Initial parse:
+{parsed_json}
 
 Return ONLY a valid JSON array of transactions matching this schema exactly:
 [{{"date":"YYYY-MM-DD","description":"string","amount":number,"type":"debit|credit","balance":number|null}}]
@@ -481,7 +733,7 @@ Rules:
 - amount must be a positive number
 - type must be exactly "debit" or "credit"
 - balance can be null if unknown
-- Return all transactions you can find, not just the sample
+- Return every transaction in this section of text, in the order they appear
 - Do not include any explanation or markdown, only the JSON array"""
 
 
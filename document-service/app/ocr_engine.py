@@ -0,0 +1,155 @@
+"""
+ocr_engine.py — Tesseract backends behind one interface.
+
+  * tesserocr   — Tesseract's C API in-process. Engines are created once
+                  per worker process and pooled (one per concurrent page
+                  thread), so the LSTM model is loaded once, not per page,
+                  and images are handed over as raw pixel buffers.
+  * pytesseract — Writes a temp image and runs the `tesseract` binary per
+                  call. Always available where the binary is installed;
+                  the fallback.
+
+OCR_BACKEND picks one: auto (tesserocr if importable, else pytesseract),
+tesserocr or pytesseract. A tesserocr engine that cannot start (e.g. no
+tessdata) falls back to pytesseract with a warning.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+
+import numpy as np
+
+from app.utils import setup_logger
+
+logger = setup_logger("ocr-engine")
+
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto").lower()
+# tessdata directory for tesserocr (empty = the library's compiled-in default)
+OCR_TESSDATA = os.getenv("OCR_TESSDATA", "") or os.getenv("TESSDATA_PREFIX", "")
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+
+class PytesseractBackend:
+    """`tesseract` subprocess per image, via pytesseract."""
+
+    name = "pytesseract"
+
+    # Tesseract config tuned for financial documents
+    # PSM 4 = single column of variable-size text — best for tabular bank statement screenshots
+    # No character whitelist: preserves full UPI references (UPI/DR/..., UPI/CR/...)
+    _CONFIG = (
+        "--oem 3 "   # LSTM engine
+        "--psm 4"    # Single column of variable-size text
+    )
+
+    def __init__(self):
+        try:
+            import pytesseract
+        except ImportError:
+            raise RuntimeError(
+                "pytesseract is not installed. Run: pip install pytesseract"
+            )
+        self._pytesseract = pytesseract
+
+    def image_to_text(self, img: np.ndarray) -> str:
+        from PIL import Image
+        return self._pytesseract.image_to_string(
+            Image.fromarray(img), lang=OCR_LANG, config=self._CONFIG
+        )
+
+
+class TesserocrBackend:
+    """
+    Pooled in-process tesserocr engines. An engine is not thread-safe, so
+    each call checks one out of the pool (creating it on first demand) and
+    returns it afterwards; recognition itself releases the GIL.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr     # ImportError → caller falls back
+        self._tesserocr = tesserocr
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._release(self._new_engine())    # fail fast if tessdata is missing
+
+    def image_to_text(self, img: np.ndarray) -> str:
+        api = self._acquire()
+        try:
+            img = np.ascontiguousarray(img)
+            channels = 1 if img.ndim == 2 else img.shape[2]
+            if channels == 3:
+                img = np.ascontiguousarray(img[:, :, ::-1])     # BGR → RGB
+            height, width = img.shape[:2]
+            # SetImageBytes does not copy: keep `pixels` referenced until recognition is done
+            pixels = img.tobytes()
+            api.SetImageBytes(pixels, width, height, channels, width * channels)
+            text = api.GetUTF8Text()
+            api.Clear()
+        except Exception:
+            api.End()          # engine state unknown — drop it
+            raise
+        self._release(api)
+        return text
+
+    def _new_engine(self):
+        tesserocr = self._tesserocr
+        kwargs = {"path": OCR_TESSDATA} if OCR_TESSDATA else {}
+        api = tesserocr.PyTessBaseAPI(
+            lang=OCR_LANG,
+            psm=tesserocr.PSM.SINGLE_COLUMN,   # same as --psm 4
+            oem=tesserocr.OEM.DEFAULT,         # same as --oem 3
+            **kwargs,
+        )
+        with self._lock:
+            self._created += 1
+            logger.info(f"Started tesserocr engine #{self._created} (pid {os.getpid()})")
+        return api
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_engine()
+
+    def _release(self, api) -> None:
+        self._idle.put(api)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The process-wide OCR backend selected by OCR_BACKEND (created on first use)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend(OCR_BACKEND)
+    return _backend
+
+
+def _create_backend(name: str):
+    if name not in ("auto", "tesserocr", "pytesseract"):
+        logger.warning(f"Unknown OCR_BACKEND '{name}' — using auto")
+        name = "auto"
+
+    if name in ("auto", "tesserocr"):
+        try:
+            backend = TesserocrBackend()
+            logger.info("OCR backend: tesserocr (pooled in-process engines)")
+            return backend
+        except ImportError:
+            if name == "tesserocr":
+                logger.warning("OCR_BACKEND=tesserocr but tesserocr is not installed — using pytesseract")
+        except Exception as exc:
+            logger.warning(f"tesserocr engine failed to start ({exc}) — using pytesseract")
+
+    logger.info("OCR backend: pytesseract (tesseract subprocess per page)")
+    return PytesseractBackend()
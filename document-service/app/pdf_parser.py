@@ -2,21 +2,41 @@
 pdf_parser.py — Extract text from text-based PDFs.
 
 Strategy:
-  1. Try pdfplumber (best for financial tables / formatted PDFs).
+  0. Triage with PyMuPDF: sample a few pages' text layer and image coverage.
+     No text on any sampled page → scanned, without touching pdfplumber.
+  1. Try pdfplumber (best for financial tables / formatted PDFs) — only on
+     pages that have a text layer, and table detection only on pages with
+     ruling lines.
   2. Fall back to PyMuPDF (fitz) if pdfplumber yields no text.
   3. If still empty, signal that the PDF is scanned → caller should use OCR.
+
+Text PDFs can still contain scanned pages (e.g. a text cover page in front
+of scanned statement pages): image-covered pages without a text layer are
+listed in `ocr_pages` for the caller to OCR alongside the text pages.
+
+Every entry point accepts raw bytes or a DocumentSession; pass the session
+to reuse the already-opened document across stages.
 """
 
 from __future__ import annotations
 
-import io
+import os
 from dataclasses import dataclass, field
-from typing import List
+from typing import Dict, List, Set
 
-from app.utils import bytes_to_stream, setup_logger
+from app.document import DocumentSession, PdfSource, open_session
+from app.metrics import timed
+from app.utils import setup_logger
 
 logger = setup_logger("pdf-parser")
 
+# Pages sampled (spread over the document) to tell text PDFs from scans
+TRIAGE_SAMPLE_PAGES = int(os.getenv("TRIAGE_SAMPLE_PAGES", "5"))
+# A page with fewer text-layer characters counts as having no text layer
+_MIN_TEXT_CHARS = 20
+# Share of a page covered by images above which a text-less page is a scan
+_SCAN_IMAGE_COVERAGE = 0.5
+
 
 @dataclass
 class ParsedPage:
@@ -31,32 +51,83 @@ class PdfParseResult:
     pages: List[ParsedPage] = field(default_factory=list)
     is_scanned: bool = False          # True → caller should run OCR
     used_fallback: bool = False       # True → pdfplumber failed, used PyMuPDF
+    ocr_pages: List[int] = field(default_factory=list)   # pages with no text layer to OCR
 
     @property
     def full_text(self) -> str:
         return "\n".join(p.text for p in self.pages if p.text)
 
 
+@dataclass
+class PdfTriage:
+    page_count: int
+    text_pages: List[int] = field(default_factory=list)       # sampled pages with a text layer
+    image_coverage: Dict[int, float] = field(default_factory=dict)   # sampled page → 0.0–1.0
+
+    @property
+    def is_scanned(self) -> bool:
+        return not self.text_pages
+
+
 # ---------------------------------------------------------------------------
-# Public entry point
+# Public entry points
 # ---------------------------------------------------------------------------
 
-def parse_pdf(data: bytes) -> PdfParseResult:
+def triage_pdf(source: PdfSource, sample: int = TRIAGE_SAMPLE_PAGES) -> PdfTriage:
+    """
+    Decide text vs scanned from PyMuPDF alone, on `sample` pages spread over
+    the document. Sampled pages that are blank (no text, no images) say
+    nothing, so if every sampled page is blank the rest are checked too.
+    """
+    with open_session(source) as doc:
+        triage = PdfTriage(page_count=doc.page_count)
+        sampled = _sample_pages(doc.page_count, sample)
+        for page_no in sampled:
+            _triage_page(doc, page_no, triage)
+
+        if not triage.text_pages and not any(
+            c >= _SCAN_IMAGE_COVERAGE for c in triage.image_coverage.values()
+        ):
+            for page_no in range(1, doc.page_count + 1):
+                if page_no not in triage.image_coverage:
+                    _triage_page(doc, page_no, triage)
+
+    kind = "scanned" if triage.is_scanned else "text"
+    logger.info(
+        f"Triage: {kind} PDF ({len(triage.text_pages)}/{len(triage.image_coverage)} "
+        f"sampled pages with text, {triage.page_count} pages)"
+    )
+    return triage
+
+
+@timed("parse_pdf")
+def parse_pdf(source: PdfSource) -> PdfParseResult:
     """
-    Parse a PDF from raw bytes.
+    Parse a PDF from raw bytes or an open DocumentSession.
     Returns a PdfParseResult; if is_scanned=True the caller must use OCR.
     """
-    result = _try_pdfplumber(data)
-    if result is None or not result.full_text.strip():
-        logger.info("pdfplumber yielded no text — trying PyMuPDF fallback")
-        result = _try_pymupdf(data)
-        if result:
-            result.used_fallback = True
+    with open_session(source) as doc:
+        all_pages = list(range(1, doc.page_count + 1))
+        triage = triage_pdf(doc)
+        if triage.is_scanned:
+            logger.warning("PDF appears to be scanned — signalling OCR required")
+            return PdfParseResult(is_scanned=True, ocr_pages=all_pages)
+
+        ocr_pages = [i for i in all_pages if _needs_ocr(doc, i, triage)]
+        result = _try_pdfplumber(doc, skip=set(ocr_pages))
+        if result is None or not result.full_text.strip():
+            logger.info("pdfplumber yielded no text — trying PyMuPDF fallback")
+            result = _try_pymupdf(doc)
+            if result:
+                result.used_fallback = True
 
     if result is None or not result.full_text.strip():
         logger.warning("PDF appears to be scanned — signalling OCR required")
-        result = PdfParseResult(is_scanned=True)
+        return PdfParseResult(is_scanned=True, ocr_pages=all_pages)
 
+    if ocr_pages:
+        logger.info(f"Pages without a text layer, to OCR: {ocr_pages}")
+    result.ocr_pages = ocr_pages
     return result
 
 
@@ -64,36 +135,41 @@ def parse_pdf(data: bytes) -> PdfParseResult:
 # pdfplumber extraction
 # ---------------------------------------------------------------------------
 
-def _try_pdfplumber(data: bytes) -> PdfParseResult | None:
+def _try_pdfplumber(doc: DocumentSession, skip: Set[int] = frozenset()) -> PdfParseResult | None:
     try:
-        import pdfplumber
+        pdf = doc.plumber_pdf
     except ImportError:
         logger.warning("pdfplumber not installed — skipping")
         return None
 
     try:
         result = PdfParseResult()
-        with pdfplumber.open(bytes_to_stream(data)) as pdf:
-            for i, page in enumerate(pdf.pages, start=1):
-                text = page.extract_text() or ""
-                tables = page.extract_tables() or []
-                parsed_tables: List[List[str]] = []
-                for table in tables:
-                    # Flatten each row, convert None → ""
-                    cleaned = [
-                        [str(cell) if cell is not None else "" for cell in row]
-                        for row in table
-                    ]
-                    parsed_tables.extend(cleaned)
-
-                result.pages.append(
-                    ParsedPage(
-                        page_number=i,
-                        text=text,
-                        has_tables=bool(tables),
-                        table_data=parsed_tables,
-                    )
+        for i, page in enumerate(pdf.pages, start=1):
+            if i in skip or not doc.page_text(i).strip():
+                # No text layer (or left to OCR) — skip pdfplumber's layout analysis
+                result.pages.append(ParsedPage(page_number=i, text=""))
+                continue
+            text = page.extract_text() or ""
+            # The default "lines" strategy needs ruling lines; skip detection without them
+            tables = (page.extract_tables() or []) if page.edges else []
+            parsed_tables: List[List[str]] = []
+            for table in tables:
+                # Flatten each row, convert None → ""
+                cleaned = [
+                    [str(cell) if cell is not None else "" for cell in row]
+                    for row in table
+                ]
+                parsed_tables.extend(cleaned)
+
+            result.pages.append(
+                ParsedPage(
+                    page_number=i,
+                    text=text,
+                    has_tables=bool(tables),
+                    table_data=parsed_tables,
                 )
+            )
+            page.close()   # drop the page's layout cache — keeps peak memory to one page
         logger.info(f"pdfplumber extracted {len(result.pages)} pages")
         return result
     except Exception as exc:
@@ -102,23 +178,66 @@ def _try_pdfplumber(data: bytes) -> PdfParseResult | None:
 
 
 # ---------------------------------------------------------------------------
-# PyMuPDF fallback
+# Triage helpers
 # ---------------------------------------------------------------------------
 
-def _try_pymupdf(data: bytes) -> PdfParseResult | None:
-    try:
-        import fitz  # PyMuPDF
-    except ImportError:
-        logger.warning("PyMuPDF not installed — skipping")
-        return None
+def _sample_pages(page_count: int, sample: int) -> List[int]:
+    """Up to `sample` page numbers evenly spread from the first to the last page."""
+    if sample <= 0 or page_count <= sample:
+        return list(range(1, page_count + 1))
+    if sample == 1:
+        return [1]
+    step = (page_count - 1) / (sample - 1)
+    return sorted({1 + round(k * step) for k in range(sample)})
+
+
+def _has_text_layer(doc: DocumentSession, page_no: int) -> bool:
+    return len(doc.page_text(page_no).strip()) >= _MIN_TEXT_CHARS
+
+
+def _triage_page(doc: DocumentSession, page_no: int, triage: PdfTriage) -> None:
+    if _has_text_layer(doc, page_no):
+        triage.text_pages.append(page_no)
+    triage.image_coverage[page_no] = _image_coverage(doc, page_no)
+
+
+def _needs_ocr(doc: DocumentSession, page_no: int, triage: PdfTriage) -> bool:
+    """A page without a text layer that is mostly image — a scan to OCR."""
+    if _has_text_layer(doc, page_no):
+        return False
+    coverage = triage.image_coverage.get(page_no)
+    if coverage is None:
+        coverage = _image_coverage(doc, page_no)
+    return coverage >= _SCAN_IMAGE_COVERAGE
 
+
+def _image_coverage(doc: DocumentSession, page_no: int) -> float:
+    """Fraction of the page area covered by placed images (overlaps capped at 1.0)."""
+    with doc.locked():
+        page = doc.fitz_doc[page_no - 1]
+        rect = page.rect
+        area = rect.width * rect.height
+        if area <= 0:
+            return 0.0
+        covered = 0.0
+        for info in page.get_image_info():
+            x0, y0, x1, y1 = info["bbox"]
+            w = min(x1, rect.x1) - max(x0, rect.x0)
+            h = min(y1, rect.y1) - max(y0, rect.y0)
+            if w > 0 and h > 0:
+                covered += w * h
+    return min(covered / area, 1.0)
+
+
+# ---------------------------------------------------------------------------
+# PyMuPDF fallback
+# ---------------------------------------------------------------------------
+
+def _try_pymupdf(doc: DocumentSession) -> PdfParseResult | None:
     try:
         result = PdfParseResult()
-        doc = fitz.open(stream=data, filetype="pdf")
-        for i, page in enumerate(doc, start=1):
-            text = page.get_text("text") or ""
-            result.pages.append(ParsedPage(page_number=i, text=text))
-        doc.close()
+        for i in range(1, doc.page_count + 1):
+            result.pages.append(ParsedPage(page_number=i, text=doc.page_text(i)))
         logger.info(f"PyMuPDF extracted {len(result.pages)} pages")
         return result
     except Exception as exc:
@@ -130,22 +249,13 @@ def _try_pymupdf(data: bytes) -> PdfParseResult | None:
 # Render PDF pages to images (for scanned PDFs)
 # ---------------------------------------------------------------------------
 
-def pdf_pages_to_images(data: bytes) -> List[bytes]:
+def pdf_pages_to_images(source: PdfSource) -> List[bytes]:
     """
     Convert each PDF page to a PNG byte string using PyMuPDF.
     Used as pre-step before OCR on scanned PDFs.
     """
-    try:
-        import fitz
-    except ImportError:
-        raise RuntimeError("PyMuPDF is required for scanned PDF → image conversion")
-
-    images: List[bytes] = []
-    doc = fitz.open(stream=data, filetype="pdf")
-    for page in doc:
-        mat = fitz.Matrix(2.0, 2.0)          # 2× zoom for sharper OCR
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        images.append(pix.tobytes("png"))
-    doc.close()
+    with open_session(source) as doc:
+        # 2× zoom for sharper OCR
+        images = [doc.render_png(i, zoom=2.0) for i in range(1, doc.page_count + 1)]
     logger.info(f"Converted {len(images)} PDF pages to images for OCR")
     return images
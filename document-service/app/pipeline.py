@@ -0,0 +1,387 @@
+"""
+pipeline.py — Synchronous extraction jobs executed in the CPU worker pool.
+
+Each job takes the raw document bytes and returns normalized transactions
+plus the raw text used for them. A PDF's stages (parse → tables or OCR →
+normalize) share one DocumentSession, which holds open handles and so
+cannot cross process boundaries — they therefore run together as a single
+worker job rather than being shipped between processes stage by stage.
+
+Routing is per page: text-layer pages go through table/text extraction,
+image-only pages are OCR'd, and the parts are merged in page order — a
+text cover page in front of scanned statement pages costs one parse, not
+an OCR pass over the whole document.
+
+The streaming endpoint splits a scanned PDF differently: the document is
+written to disk once, and each OCR page is an independent job
+(ocr_pdf_page) that opens the file by path, so pages finish — and can be
+emitted — one by one.
+
+Table rows come from one of two engines (TABLE_ENGINE, or per request):
+  * native  — pdfplumber rows / PyMuPDF word geometry already at hand
+              (native_tables); no Ghostscript, no second PDF parse
+  * camelot — Camelot lattice/stream on the candidate pages
+  * auto    — native first; Camelot only when the native rows yield fewer
+              transactions than the page text itself shows, or their
+              running balances do not reconcile
+
+Reconciliation (app.reconcile) also decides whether OCR is worth repeating:
+a scanned page (or image) whose running balance breaks is OCR'd again with
+the "accurate" profile, and the re-read replaces it only when it reconciles
+better. Pages that reconcile, or show no balances, are OCR'd once.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from app.document import DocumentSession
+from app.native_tables import extract_native_tables
+from app.normalizer import (
+    NormalizeResult,
+    count_lines,
+    merge_results,
+    normalize_table_frames,
+    normalize_table_rows,
+    normalize_text,
+)
+from app.ocr import PageText, extract_image_page, extract_pages_from_pdf
+from app.pdf_parser import ParsedPage, PdfParseResult, parse_pdf
+from app.reconcile import reconcile
+from app.table_extractor import candidate_pages, extract_table_frames
+from app.utils import setup_logger
+
+logger = setup_logger("pipeline")
+
+TABLE_ENGINES = ("auto", "native", "camelot")
+TABLE_ENGINE = os.getenv("TABLE_ENGINE", "auto").lower()
+if TABLE_ENGINE not in TABLE_ENGINES:
+    logger.warning(f"Unknown TABLE_ENGINE '{TABLE_ENGINE}' — using auto")
+    TABLE_ENGINE = "auto"
+
+# Profile for re-reading scanned pages whose running balance does not reconcile
+_REOCR_PROFILE = "accurate"
+
+
+@dataclass
+class ExtractionResult:
+    result: NormalizeResult
+    raw_text: str                 # text the transactions came from (input to LLM phase)
+    pages_processed: int
+    extraction_method: str
+
+
+@dataclass
+class PageExtraction:
+    page_number: int              # 1-based
+    result: NormalizeResult
+    raw_text: str
+    ocr_profile: str = ""         # OCR preprocessing profile that read the page, if OCR'd
+
+
+@dataclass
+class TextLayerResult:
+    page_count: int
+    # (first page, extraction) per run of text pages between image-only pages
+    runs: List[Tuple[int, ExtractionResult]] = field(default_factory=list)
+    ocr_pages: List[int] = field(default_factory=list)   # image-only pages still to OCR
+
+    @property
+    def extraction(self) -> Optional[ExtractionResult]:
+        """All text-layer runs as one extraction; None → no text layer (scanned PDF)."""
+        if len(self.runs) <= 1:
+            return self.runs[0][1] if self.runs else None
+        return _combine(
+            [_as_page(first, run) for first, run in self.runs],
+            sum(run.pages_processed for _, run in self.runs),
+            _run_methods(self.runs),
+        )
+
+
+def extract_image(data: bytes) -> ExtractionResult:
+    """Image upload → OCR → regex normalization (re-OCR'd if the balances break)."""
+    page = _reocr_if_broken(
+        _ocr_extraction(1, extract_image_page(data)),
+        lambda: extract_image_page(data, profile=_REOCR_PROFILE),
+    )
+    return ExtractionResult(
+        result=page.result,
+        raw_text=page.raw_text,
+        pages_processed=1,
+        extraction_method="ocr",
+    )
+
+
+def extract_pdf(
+    data: bytes,
+    table_engine: Optional[str] = None,
+    bank_name: Optional[str] = None,
+) -> ExtractionResult:
+    """
+    PDF → text/table extraction for text pages, OCR for image-only pages.
+    `bank_name` selects the bank's table column layout (see app.layouts).
+    """
+    with DocumentSession(data) as doc:
+        layer = _extract_text_layer(doc, table_engine, bank_name)
+        if layer.extraction is not None and not layer.ocr_pages:
+            return layer.extraction
+
+        if layer.extraction is None:
+            # Scanned PDF → render pages → OCR
+            logger.info("Scanned PDF detected — running per-page OCR")
+            pages = _ocr_pdf_pages(doc, list(range(1, doc.page_count + 1)))
+            if not pages:
+                raise RuntimeError(f"OCR failed on all {doc.page_count} pages")
+            return _combine(pages, doc.page_count, "ocr")
+
+        # Hybrid PDF → OCR only the image-only pages
+        logger.info(f"Hybrid PDF — OCR for pages {layer.ocr_pages}")
+        return merge_pages(layer, _ocr_pdf_pages(doc, layer.ocr_pages))
+
+
+def extract_pdf_text(
+    path: str,
+    table_engine: Optional[str] = None,
+    bank_name: Optional[str] = None,
+) -> TextLayerResult:
+    """
+    Text-layer half of extract_pdf() for a PDF on disk. The caller OCRs
+    `ocr_pages` (every page of a scanned PDF) with ocr_pdf_page() and
+    combines the parts with merge_pages().
+    """
+    with DocumentSession(path=path) as doc:
+        return _extract_text_layer(doc, table_engine, bank_name)
+
+
+def merge_pages(layer: TextLayerResult, ocr_pages: List[PageExtraction]) -> ExtractionResult:
+    """Merge the text-layer runs and OCR'd pages in page order."""
+    parts = [_as_page(first, run) for first, run in layer.runs] + list(ocr_pages)
+    methods = _run_methods(layer.runs)
+    if ocr_pages:
+        methods = f"{methods}+ocr" if methods else "ocr"
+    return _combine(parts, layer.page_count, methods)
+
+
+def spool_pdf(data: bytes) -> str:
+    """Write PDF bytes to a temp file for path-based jobs; the caller deletes it."""
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(data)
+        return tmp.name
+
+
+def ocr_pdf_page(path: str, page_no: int) -> PageExtraction:
+    """OCR and normalize a single page of a scanned PDF on disk (re-OCR'd if its balances break)."""
+    with DocumentSession(path=path) as doc:
+        ocr = extract_pages_from_pdf(doc, [page_no])
+        if page_no not in ocr:
+            raise RuntimeError(f"OCR failed on page {page_no}")
+        return _reocr_if_broken(
+            _ocr_extraction(page_no, ocr[page_no]),
+            lambda: extract_pages_from_pdf(doc, [page_no], profile=_REOCR_PROFILE)[page_no],
+        )
+
+
+def _ocr_pdf_pages(doc: DocumentSession, page_numbers: List[int]) -> List[PageExtraction]:
+    """
+    OCR and normalize the given pages; the ones whose running balance breaks
+    are OCR'd again together with the accurate profile. Failed pages are left out.
+    """
+    pages = {n: _ocr_extraction(n, ocr) for n, ocr in extract_pages_from_pdf(doc, page_numbers).items()}
+    retry = [n for n, page in pages.items() if _should_reocr(page)]
+    if retry:
+        logger.info(f"Balances do not reconcile on pages {retry} — OCR again with '{_REOCR_PROFILE}'")
+        for n, ocr in extract_pages_from_pdf(doc, retry, profile=_REOCR_PROFILE).items():
+            pages[n] = _pick_page(pages[n], ocr)
+    return [pages[n] for n in page_numbers if n in pages]
+
+
+def _ocr_extraction(page_number: int, ocr: PageText) -> PageExtraction:
+    return PageExtraction(
+        page_number=page_number,
+        result=normalize_text(ocr.text),
+        raw_text=ocr.text,
+        ocr_profile=ocr.profile,
+    )
+
+
+def _reocr_if_broken(page: PageExtraction, reread: Callable[[], PageText]) -> PageExtraction:
+    """`page`, or its re-read with the accurate profile when its balances break and that reconciles better."""
+    if not _should_reocr(page):
+        return page
+    logger.info(f"Balances do not reconcile on page {page.page_number} — OCR again with '{_REOCR_PROFILE}'")
+    try:
+        ocr = reread()
+    except Exception as exc:
+        logger.warning(f"Re-OCR of page {page.page_number} failed: {exc}")
+        return page
+    return _pick_page(page, ocr)
+
+
+def _should_reocr(page: PageExtraction) -> bool:
+    """Balances break and the page was not already read with the accurate profile (e.g. by auto)."""
+    already_accurate = page.ocr_profile.split("+")[0] == _REOCR_PROFILE
+    return not already_accurate and reconcile(page.result.transactions).needs_retry
+
+
+def _pick_page(page: PageExtraction, ocr: PageText) -> PageExtraction:
+    """The re-OCR'd version of `page` if it reconciles better, else `page`."""
+    candidate = _ocr_extraction(page.page_number, ocr)
+    if reconcile(candidate.result.transactions).better_than(reconcile(page.result.transactions)):
+        logger.info(f"Re-OCR improved page {page.page_number}")
+        return candidate
+    return page
+
+
+def _extract_text_layer(
+    doc: DocumentSession,
+    table_engine: Optional[str] = None,
+    bank_name: Optional[str] = None,
+) -> TextLayerResult:
+    """
+    Tables or text from a PDF's text-layer pages, plus the pages left to OCR.
+    Text pages are extracted together (a table may run over several pages),
+    except that image-only pages split them into separately extracted runs
+    so every part can be placed in page order.
+    """
+    pdf_result = parse_pdf(doc)
+    layer = TextLayerResult(page_count=doc.page_count, ocr_pages=pdf_result.ocr_pages)
+    if pdf_result.is_scanned:
+        return layer
+
+    for run in _text_runs(pdf_result):
+        if run.full_text.strip():
+            extraction = _extract_run(doc, run, table_engine or TABLE_ENGINE, bank_name)
+            layer.runs.append((run.pages[0].page_number, extraction))
+    return layer
+
+
+def _text_runs(pdf_result: PdfParseResult) -> List[PdfParseResult]:
+    """Split the parsed pages into runs at the image-only pages."""
+    if not pdf_result.ocr_pages:
+        return [pdf_result]
+    ocr_pages = set(pdf_result.ocr_pages)
+    runs: List[List[ParsedPage]] = [[]]
+    for page in pdf_result.pages:
+        if page.page_number in ocr_pages:
+            runs.append([])
+        else:
+            runs[-1].append(page)
+    return [PdfParseResult(pages=pages, used_fallback=pdf_result.used_fallback) for pages in runs if pages]
+
+
+def _extract_run(
+    doc: DocumentSession,
+    pdf_result: PdfParseResult,
+    engine: str,
+    bank_name: Optional[str] = None,
+) -> ExtractionResult:
+    raw_text = pdf_result.full_text
+    pages_processed = len(pdf_result.pages)
+
+    # Text PDF → try table extraction first, on the pages that can hold tables
+    table = _extract_table_layer(doc, pdf_result, engine, bank_name)
+    if table is not None:
+        result, method = table
+        return ExtractionResult(
+            result=result,
+            raw_text=raw_text,
+            pages_processed=pages_processed,
+            extraction_method=method,
+        )
+
+    logger.info("No tables found — falling back to text normalization")
+    return ExtractionResult(
+        result=normalize_text(raw_text),
+        raw_text=raw_text,
+        pages_processed=pages_processed,
+        extraction_method="pdfplumber",
+    )
+
+
+def _extract_table_layer(
+    doc: DocumentSession,
+    pdf_result: PdfParseResult,
+    engine: str,
+    bank_name: Optional[str] = None,
+) -> Optional[Tuple[NormalizeResult, str]]:
+    """(normalized table rows, extraction method) from the chosen engine, or None."""
+    pages = candidate_pages(pdf_result)
+    if pages is None and len(pdf_result.pages) < doc.page_count:
+        # No per-page table info, but only this run's pages are candidates
+        pages = {p.page_number: "lattice" for p in pdf_result.pages}
+
+    # auto: the text layer is a cheap yardstick for what the tables should hold
+    text_rows = len(normalize_text(pdf_result.full_text).transactions) if engine == "auto" else 0
+
+    native: Optional[NormalizeResult] = None
+    if engine in ("auto", "native"):
+        rows = extract_native_tables(doc, pdf_result, pages)
+        if rows:
+            native = normalize_table_rows(rows, bank_name)
+            if engine == "native" or (
+                _covers_text_layer(native, text_rows)
+                and not reconcile(native.transactions).needs_retry
+            ):
+                logger.info(f"Using native table rows ({len(rows)} rows)")
+                return native, "native-tables"
+        if engine == "native":
+            return None
+        if native is not None and native.transactions:
+            logger.info("Native table rows incomplete or unreconciled — trying Camelot")
+        else:
+            logger.info("No native table rows — trying Camelot")
+            native = None
+
+    frames = extract_table_frames(doc, pages)
+    camelot = normalize_table_frames(frames, bank_name) if frames else None
+    if engine == "auto" and camelot is not None and not _covers_text_layer(camelot, text_rows):
+        logger.info(f"Camelot tables hold fewer transactions than the text layer ({text_rows}) — ignoring them")
+        camelot = None
+    if native is not None and (camelot is None or _prefer_native(native, camelot)):
+        logger.info("Keeping native table rows — Camelot did not do better")
+        return native, "native-tables"
+    if camelot is not None:
+        logger.info(f"Using Camelot tables ({len(frames)} tables)")
+        return camelot, "camelot"
+    return None
+
+
+def _covers_text_layer(result: NormalizeResult, text_rows: int) -> bool:
+    """Table rows yielded transactions, at least as many as the plain text layer does."""
+    return bool(result.transactions) and len(result.transactions) >= text_rows
+
+
+def _prefer_native(native: NormalizeResult, camelot: NormalizeResult) -> bool:
+    """Whether unreconciled native rows beat Camelot's: they reconcile better, or Camelot found fewer rows."""
+    native_check = reconcile(native.transactions)
+    camelot_check = reconcile(camelot.transactions)
+    if native_check.better_than(camelot_check):
+        return True
+    if camelot_check.better_than(native_check):
+        return False
+    return len(camelot.transactions) < len(native.transactions)
+
+
+def _as_page(first_page: int, extraction: ExtractionResult) -> PageExtraction:
+    return PageExtraction(page_number=first_page, result=extraction.result, raw_text=extraction.raw_text)
+
+
+def _combine(parts: List[PageExtraction], pages_processed: int, method: str) -> ExtractionResult:
+    parts = sorted(parts, key=lambda p: p.page_number)
+    return ExtractionResult(
+        result=merge_results([p.result for p in parts], sum(count_lines(p.raw_text) for p in parts)),
+        raw_text="\n".join(p.raw_text for p in parts),
+        pages_processed=pages_processed,
+        extraction_method=method,
+    )
+
+
+def _run_methods(runs: List[Tuple[int, ExtractionResult]]) -> str:
+    """Distinct methods of the runs that yielded transactions (of all runs if none did)."""
+    methods = [run.extraction_method for _, run in runs if run.result.transactions]
+    if not methods:
+        methods = [run.extraction_method for _, run in runs]
+    return "+".join(dict.fromkeys(methods))
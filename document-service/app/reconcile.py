@@ -0,0 +1,132 @@
+"""
+reconcile.py — Check parsed transactions against the statement's running balance.
+
+A statement row that shows a balance must follow from the last row before
+it that showed one: that balance, minus the debits and plus the credits in
+between. A parse that keeps this chain intact (within a paisa) got every
+amount, type and balance of those rows right, which field-presence scoring
+(_compute_confidence) cannot tell.
+
+reconcile() walks the chain in both directions (statements list oldest or
+newest first), keeps the direction that breaks less often, and returns:
+
+  * score  — share of checked steps that reconcile; None when fewer than two
+             rows carry a balance and nothing can be checked
+  * broken — indices of the rows blamed for the failed steps
+
+The score gates the costly fallbacks: a statement scoring at least
+RECONCILE_MIN_SCORE skips them, an unreconciled one retries only the OCR
+pages or LLM chunks holding its broken rows (see pipeline and main).
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+from app.normalizer import Transaction
+
+# A statement reconciling at least this well is trusted as parsed
+RECONCILE_MIN_SCORE = float(os.getenv("RECONCILE_MIN_SCORE", "0.98"))
+
+# Balances are printed to the paisa; allow for float drift on top
+_TOLERANCE = 0.011
+
+
+@dataclass
+class Reconciliation:
+    checked: int = 0                    # balance-to-balance steps compared
+    failed: int = 0                     # steps that did not add up
+    broken: List[int] = field(default_factory=list)   # row indices, ascending
+    newest_first: bool = False
+
+    @property
+    def score(self) -> Optional[float]:
+        if not self.checked:
+            return None
+        return round((self.checked - self.failed) / self.checked, 3)
+
+    @property
+    def trusted(self) -> bool:
+        """The chain was checked and holds — no fallback can improve on this parse."""
+        score = self.score
+        return score is not None and score >= RECONCILE_MIN_SCORE
+
+    @property
+    def needs_retry(self) -> bool:
+        """The chain was checked and does not hold — worth a more expensive pass."""
+        score = self.score
+        return score is not None and score < RECONCILE_MIN_SCORE
+
+    def better_than(self, other: "Reconciliation") -> bool:
+        """Strictly more consistent than `other` (an unchecked parse never is)."""
+        if self.score is None:
+            return False
+        if other.score is None:
+            return True
+        return (self.score, -self.failed) > (other.score, -other.failed)
+
+
+def reconcile(transactions: Sequence[Transaction]) -> Reconciliation:
+    """Check the running-balance chain of document-ordered transactions."""
+    forward = _check(list(transactions))
+    if not forward.failed:
+        return forward
+    backward = _check(list(reversed(transactions)))
+    if backward.checked and backward.failed < forward.failed:
+        last = len(transactions) - 1
+        return Reconciliation(
+            checked=backward.checked,
+            failed=backward.failed,
+            broken=sorted(last - i for i in backward.broken),
+            newest_first=True,
+        )
+    return forward
+
+
+def _check(rows: List[Transaction]) -> Reconciliation:
+    """Walk oldest-first rows; a failed step blames the rows since the previous balance."""
+    result = Reconciliation()
+    broken = set()
+    anchor: Optional[int] = None        # last row with a balance
+    delta = 0.0                         # signed amounts since that row
+    skip_next = False
+    for i, t in enumerate(rows):
+        delta += _signed(t)
+        if t.balance is None:
+            continue
+        if anchor is not None:
+            result.checked += 1
+            if abs(rows[anchor].balance + delta - t.balance) > _TOLERANCE:
+                result.failed += 1
+                if skip_next:
+                    # Already blamed: the previous row's own balance was misread
+                    skip_next = False
+                elif _balance_misread(rows, anchor, i):
+                    broken.add(i)
+                    skip_next = True
+                else:
+                    broken.update(range(anchor + 1, i + 1))
+            else:
+                skip_next = False
+        anchor, delta = i, 0.0
+    result.broken = sorted(broken)
+    return result
+
+
+def _balance_misread(rows: List[Transaction], anchor: int, i: int) -> bool:
+    """
+    True when row i's amounts are right and only its balance is off: the
+    chain resumes at the next balance as if row i's balance were skipped.
+    """
+    delta = sum(_signed(t) for t in rows[anchor + 1:i + 1])
+    for t in rows[i + 1:]:
+        delta += _signed(t)
+        if t.balance is not None:
+            return abs(rows[anchor].balance + delta - t.balance) <= _TOLERANCE
+    return False
+
+
+def _signed(t: Transaction) -> float:
+    return t.amount if t.type == "credit" else -t.amount
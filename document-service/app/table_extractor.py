@@ -1,35 +1,82 @@
 """
 table_extractor.py — Extract tabular data from text-based PDFs using Camelot.
 
-Two extraction modes tried in order:
-  1. Lattice — for PDFs with visible grid lines (most bank statements)
-  2. Stream  — for PDFs where columns are separated by whitespace only
-
-Returns a list of rows (each row = list of strings), ready for the normalizer.
+Two extraction modes, chosen per page:
+  1. Lattice — for pages with visible grid lines (most bank statements)
+  2. Stream  — for pages where columns are separated by whitespace only
+
+Only candidate pages are sent to Camelot (see candidate_pages): pages where
+pdfplumber saw ruled tables start with lattice, pages whose text already
+reads like transaction rows go straight to stream, everything else is
+skipped. Lattice pages that yield nothing are retried in stream mode.
+
+Returns a list of rows (each row = list of strings), ready for the normalizer,
+or — extract_table_frames — Camelot's DataFrames as they are, for
+normalize_table_frames.
 """
 
 from __future__ import annotations
 
-import io
-import tempfile
+import inspect
 import os
-from typing import List
+from typing import Dict, List, Optional
 
+from app.document import PdfSource, open_session
+from app.metrics import stage
+from app.normalizer import normalize_text, table_frame_rows
+from app.pdf_parser import PdfParseResult
 from app.utils import setup_logger
 
 logger = setup_logger("table-extractor")
 
-# Camelot requires a file path, not a stream — we use a temp file.
+# Camelot requires a file path, not a stream — the DocumentSession writes
+# one temp-file copy (or reuses the file it was opened from) for both flavors.
+
+# >1 lets Camelot parse a call's pages in that many processes (if the installed
+# version supports `parallel`). We already run inside a CPU-pool worker, so
+# this stays opt-in to avoid oversubscribing the cores.
+TABLE_MAX_PARALLEL = int(os.getenv("TABLE_MAX_PARALLEL", "1"))
 
+# Transaction-like lines a page without ruled tables needs to be tried in stream mode
+_STREAM_MIN_ROWS = 2
 
-def extract_tables(data: bytes) -> List[List[str]]:
+
+def candidate_pages(parsed: PdfParseResult) -> Optional[Dict[int, str]]:
+    """
+    Map page number → first Camelot flavor to try, from the text-layer parse.
+    Returns None when there is no per-page table information (PyMuPDF
+    fallback), meaning every page is a lattice candidate.
     """
-    Extract all table rows from a PDF byte payload.
+    if parsed.used_fallback:
+        return None
+    flavors: Dict[int, str] = {}
+    for page in parsed.pages:
+        if page.has_tables:
+            flavors[page.page_number] = "lattice"
+        elif len(normalize_text(page.text).transactions) >= _STREAM_MIN_ROWS:
+            flavors[page.page_number] = "stream"
+    return flavors
+
+
+def extract_tables(source: PdfSource, pages: Optional[Dict[int, str]] = None) -> List[List[str]]:
+    """
+    Extract table rows from a PDF (raw bytes or an open DocumentSession).
+
+    `pages` maps page number → first flavor to try (see candidate_pages);
+    None means all pages, lattice first.
 
-    Returns a flat list of rows across all tables and pages.
-    Each row is a list of cell strings.
+    Returns a flat list of rows across all tables, in page order.
+    Each row is a list of stripped cell strings; fully-empty rows are dropped.
     Returns an empty list if Camelot is not available or no tables found.
     """
+    return table_frame_rows(extract_table_frames(source, pages))
+
+
+def extract_table_frames(source: PdfSource, pages: Optional[Dict[int, str]] = None) -> list:
+    """
+    Like extract_tables(), but returns each table's DataFrame (cells
+    unstripped, empty rows kept) in page order, for normalize_table_frames().
+    """
     try:
         import camelot
     except ImportError:
@@ -39,52 +86,58 @@ def extract_tables(data: bytes) -> List[List[str]]:
         )
         return []
 
-    rows: List[List[str]] = []
+    frames: list = []
 
-    # Camelot needs a real file path — write to a temp file
-    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
-
-    try:
-        # --- Try lattice first (bordered tables) ---
-        tables = _read_with_camelot(camelot, tmp_path, flavor="lattice")
-
-        if not tables:
-            logger.info("Lattice extraction found no tables — trying stream mode")
-            tables = _read_with_camelot(camelot, tmp_path, flavor="stream")
-
-        for table in tables:
-            df = table.df
-            for _, row in df.iterrows():
-                cleaned_row = [str(cell).strip() for cell in row]
-                # Skip fully-empty rows
-                if any(cell for cell in cleaned_row):
-                    rows.append(cleaned_row)
-
-        logger.info(f"Camelot extracted {len(rows)} rows from {len(tables)} tables")
-    except Exception as exc:
-        logger.error(f"Camelot extraction error: {exc}")
-    finally:
+    with open_session(source) as doc:
         try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
-
-    return rows
+            if pages is None:
+                pages = {i: "lattice" for i in range(1, doc.page_count + 1)}
+            if not pages:
+                logger.info("No table candidate pages — Camelot skipped")
+                return frames
+            tmp_path = doc.file_path()
+
+            # --- Lattice on pages with ruled tables ---
+            by_page: Dict[int, list] = {}
+            lattice_pages = sorted(p for p, flavor in pages.items() if flavor == "lattice")
+            for table in _read_with_camelot(camelot, tmp_path, "lattice", lattice_pages):
+                by_page.setdefault(int(table.page), []).append(table)
+
+            # --- Stream on whitespace-table pages and lattice pages that came back empty ---
+            stream_pages = sorted(p for p in pages if p not in by_page)
+            if stream_pages:
+                logger.info(f"Trying stream mode on pages {stream_pages}")
+            for table in _read_with_camelot(camelot, tmp_path, "stream", stream_pages):
+                by_page.setdefault(int(table.page), []).append(table)
+
+            frames = [t.df for page_no in sorted(by_page) for t in by_page[page_no]]
+            logger.info(
+                f"Camelot extracted {sum(len(df) for df in frames)} rows from {len(frames)} tables "
+                f"on {len(by_page)} of {len(pages)} candidate pages"
+            )
+        except Exception as exc:
+            logger.error(f"Camelot extraction error: {exc}")
+
+    return frames
 
 
 # ---------------------------------------------------------------------------
 # Internal helper
 # ---------------------------------------------------------------------------
 
-def _read_with_camelot(camelot, path: str, flavor: str):
+def _read_with_camelot(camelot, path: str, flavor: str, pages: List[int]):
     """
-    Run camelot.read_pdf with a given flavor.
+    Run camelot.read_pdf with a given flavor on the given pages.
     Returns list of Table objects, or empty list on failure.
     """
+    if not pages:
+        return []
+    kwargs = {}
+    if TABLE_MAX_PARALLEL > 1 and "parallel" in inspect.signature(camelot.read_pdf).parameters:
+        kwargs = {"parallel": True, "cpu_count": TABLE_MAX_PARALLEL}
     try:
-        tables = camelot.read_pdf(path, pages="all", flavor=flavor)
+        with stage(f"extract_tables_{flavor}"):
+            tables = camelot.read_pdf(path, pages=",".join(map(str, pages)), flavor=flavor, **kwargs)
         logger.info(
             f"Camelot ({flavor}) found {tables.n} tables "
             f"(avg accuracy: {_avg_accuracy(tables):.1f}%)"
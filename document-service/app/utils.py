@@ -6,8 +6,9 @@ No dependency on Supabase or the main TypeScript project.
 import io
 import logging
 import json
+import os
 import sys
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 import httpx
 
@@ -46,7 +47,7 @@ logger = setup_logger()
 # File helpers
 # ---------------------------------------------------------------------------
 
-FILE_SIZE_LIMIT_MB = 25
+FILE_SIZE_LIMIT_MB = float(os.getenv("FILE_SIZE_LIMIT_MB", "25"))
 _MAGIC = {
     b"%PDF": "pdf",
     b"\x89PNG": "png",
@@ -67,27 +68,76 @@ def detect_file_type(data: bytes) -> str:
     return "unknown"
 
 
+class FileTooLargeError(ValueError):
+    """Raised as soon as a document is known to exceed FILE_SIZE_LIMIT_MB."""
+
+    def __init__(self, size_bytes: Optional[int], limit_mb: float = FILE_SIZE_LIMIT_MB):
+        if size_bytes is None:       # streamed body cut off mid-way
+            message = f"File exceeds maximum allowed {limit_mb:g} MB"
+        else:
+            message = f"File size {size_bytes / (1024 * 1024):.1f} MB exceeds maximum allowed {limit_mb:g} MB"
+        super().__init__(message)
+
+
+def max_file_bytes(limit_mb: float = FILE_SIZE_LIMIT_MB) -> int:
+    return int(limit_mb * 1024 * 1024)
+
+
 def validate_file_size(data: bytes, limit_mb: float = FILE_SIZE_LIMIT_MB) -> None:
-    """Raise ValueError if file exceeds the size limit."""
-    size_mb = len(data) / (1024 * 1024)
-    if size_mb > limit_mb:
-        raise ValueError(
-            f"File size {size_mb:.1f} MB exceeds maximum allowed {limit_mb} MB"
-        )
+    """Raise FileTooLargeError (a ValueError) if file exceeds the size limit."""
+    if len(data) > max_file_bytes(limit_mb):
+        raise FileTooLargeError(len(data), limit_mb)
 
 
-async def fetch_file_from_url(url: str, timeout_s: float = 30.0) -> bytes:
+async def read_limited(
+    chunks: AsyncIterator[bytes],
+    limit_mb: float = FILE_SIZE_LIMIT_MB,
+    expected_size: Optional[int] = None,
+) -> bytes:
+    """
+    Collect an async byte stream, aborting with FileTooLargeError the moment
+    it passes the limit — so an oversized body is never fully buffered.
+    `expected_size` (e.g. Content-Length) is checked before reading anything.
+    """
+    limit = max_file_bytes(limit_mb)
+    if expected_size is not None and expected_size > limit:
+        raise FileTooLargeError(expected_size, limit_mb)
+
+    parts = []
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > limit:
+            raise FileTooLargeError(None, limit_mb)
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+async def fetch_file_from_url(
+    url: str,
+    timeout_s: float = 30.0,
+    client: Optional[httpx.AsyncClient] = None,
+) -> bytes:
     """
     Async-fetch a file from a public URL and return raw bytes.
-    Raises httpx.HTTPError or ValueError on failure.
+    Uses the shared keep-alive client unless `client` is given. The body is
+    streamed and abandoned as soon as it (or its Content-Length) exceeds
+    FILE_SIZE_LIMIT_MB.
+    Raises httpx.HTTPError, FileTooLargeError or ValueError on failure.
     """
+    if client is None:
+        from app.http_client import get_http_client   # local: http_client imports utils
+        client = get_http_client()
+
     logger.info(f"Fetching file from URL: {url}")
-    async with httpx.AsyncClient(follow_redirects=True, timeout=timeout_s) as client:
-        response = await client.get(url)
+    async with client.stream("GET", url, timeout=timeout_s) as response:
         response.raise_for_status()
-        data = response.content
+        content_length = response.headers.get("content-length")
+        data = await read_limited(
+            response.aiter_bytes(),
+            expected_size=int(content_length) if content_length and content_length.isdigit() else None,
+        )
 
-    validate_file_size(data)
     file_type = detect_file_type(data)
     logger.info(f"Fetched {len(data)} bytes, detected type: {file_type}")
     return data
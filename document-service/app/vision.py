@@ -0,0 +1,346 @@
+"""
+vision.py — Gemini Vision extraction: screenshot → transactions JSON.
+
+Calls the Gemini REST API directly through the shared httpx client — no
+google-generativeai package needed. The frontend retries and double-submits,
+so identical images arrive together; two layers keep them off the paid API:
+
+  * Single-flight — concurrent requests for the same image, model and
+                    prompt share one in-flight Gemini call
+  * Result cache  — successful extractions are kept in the result cache
+                    under image hash + model + prompt version, and expire
+                    after GEMINI_CACHE_TTL_S
+
+Before the call, uploads are downscaled, re-encoded and — when very tall —
+cut into overlapping tiles (see vision_prep); PDFs are rendered page by
+page. Tiles are extracted concurrently, at most VISION_MAX_PARALLEL at a
+time per upload (and within the service-wide Gemini rate limit, see
+gemini.py). Each page's tiles are merged top to bottom with the overlap
+de-duplicated, and pages are joined in page order.
+
+Counters (hits, misses, coalesced requests, Gemini calls) are reported by
+vision_stats() on /health.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from app.cache import cache_key, result_cache
+from app.executor import run_cpu, run_io
+from app.gemini import gemini_post
+from app.utils import detect_file_type, is_pdf_type, setup_logger
+from app.vision_prep import (
+    PdfTooLongError,
+    VisionImage,
+    merge_tile_transactions,
+    prep_version,
+    prepare_vision_image,
+    prepare_vision_pdf,
+)
+
+logger = setup_logger("vision")
+
+# Cached extractions are served for this long (0 = until evicted by size)
+GEMINI_CACHE_TTL_S = float(os.getenv("GEMINI_CACHE_TTL_S", "86400"))
+# Tiles of one upload (tall screenshot or PDF pages) sent to Gemini at once
+VISION_MAX_PARALLEL = int(os.getenv("VISION_MAX_PARALLEL", "4"))
+
+EXTRACT_PROMPT = """You are a bank statement data extraction engine. You process both SCREENSHOT images and PDF-exported statements.
+
+Extract EVERY transaction row. Return ONLY a raw JSON object — absolutely no markdown, no fences, no commentary.
+
+JSON schema (one object per transaction):
+{
+  "transactions": [
+    {
+      "date": "YYYY-MM-DD or null if not visible",
+      "description": "<copy the ENTIRE narration line exactly character-by-character>",
+      "upi_ref": "<12-15 digit numeric UPI reference number, or null>",
+      "source": "<the FULL NAME of the person or merchant — see rules below>",
+      "amount": 0.00,
+      "type": "debit or credit",
+      "balance": 0.00
+    }
+  ],
+  "confidence": 0.95
+}
+
+=== FULL NAME EXTRACTION (most important rule) ===
+UPI narrations follow the format: UPI/DR-or-CR/REFNO/NAME/BANKIFSC/VPA
+The NAME segment is often abbreviated in the storage key, but the ACTUAL name of the sender/receiver
+may be spelled out more completely elsewhere in that same narration or in adjacent columns.
+
+Rules for "source" field:
+1. Scan ALL slash-separated segments in the narration for human names or merchant names.
+2. Pick the LONGEST and most complete name segment as the source.
+3. If the name looks like a VPA suffix (e.g. "chandra@okicici", "john.doe@ybl"), extract the full part before @ as the name.
+4. NEVER abbreviate: use "CHANDRA KUMAR" not "CHANDRAK", "INDSTOCKS INDIA" not "INDSTK".
+5. If you see both a short code and a full name in the narration (e.g. "INDSTOCKS" and "IndiaStocks Ltd"), use the longer full form.
+6. For wallet payments (PPE, PAYTM, PHONEPE): the name comes before the wallet code — use it.
+7. Copy the source EXACTLY as written in the statement — no guessing, no expanding abbreviations yourself.
+
+=== STRICT FIELD RULES ===
+- description: Verbatim entire narration. NEVER truncate. Every slash. Every character.
+  CORRECT: "UPI/DR/978584154770/CHANDRA KUMAR/HDFC0000240/chandrk@paytm"
+  WRONG:   "UPI/DR/978584154770/CHANDRA KUMAR/HDFC"  ← truncated
+- upi_ref: ONLY the numeric reference (12-15 digits). null for non-UPI rows.
+- date: YYYY-MM-DD. Convert DD-MM-YY, DD/MM/YYYY, etc. null if date column is blank/missing.
+- amount: Positive number from the non-zero Debit or Credit column. null if completely unreadable.
+- type: "debit" = money out (UPI/DR, withdrawal). "credit" = money in (UPI/CR, deposit, salary).
+- balance: Running balance after this row. null if column absent.
+- SKIP: column headers, opening balance, closing balance, subtotal/summary rows.
+- Include ALL individual transaction rows without exception."""
+GEMINI_VISION_MODEL = "gemini-2.5-flash"
+# Part of the result-cache key — editing the prompt invalidates cached extractions
+PROMPT_VERSION = hashlib.sha256(EXTRACT_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
+class VisionError(Exception):
+    """Gemini call or response failure, with the HTTP status to report."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# ---------------------------------------------------------------------------
+# Request coalescing
+# ---------------------------------------------------------------------------
+
+@dataclass
+class VisionStats:
+    hits: int = 0           # served from the result cache
+    misses: int = 0         # needed a Gemini call
+    coalesced: int = 0      # joined an identical in-flight request
+    gemini_calls: int = 0   # one per tile
+    gemini_errors: int = 0
+    tiled_images: int = 0   # uploads split into more than one tile
+    pdf_pages: int = 0      # PDF pages rendered and sent
+
+
+_stats = VisionStats()
+
+
+class SingleFlight:
+    """
+    At most one running task per key; concurrent callers with the same key
+    await that task instead of starting their own. The task is shielded, so
+    a caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """(fn's result, whether it was shared with an earlier caller)."""
+        task = self._tasks.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+_inflight = SingleFlight()
+
+
+def vision_stats() -> dict:
+    return {**asdict(_stats), "in_flight": len(_inflight)}
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
+async def extract_transactions(data: bytes, mime_type: str, api_key: str) -> Tuple[dict, str]:
+    """
+    Transactions from one statement image or PDF, plus how they were obtained:
+    "HIT" (result cache), "MISS" (this request called Gemini) or
+    "COALESCED" (shared an identical in-flight request). Raises VisionError.
+    """
+    version = f"{GEMINI_VISION_MODEL}:{PROMPT_VERSION}:{prep_version()}"
+    key = cache_key(data, "extract-transactions", version)
+
+    async def lookup_or_call() -> Tuple[dict, bool]:
+        cached = await run_io(result_cache.get, key, GEMINI_CACHE_TTL_S or None)
+        if cached is not None:
+            _stats.hits += 1
+            return cached, True
+        _stats.misses += 1
+        result = await _extract_upload(data, mime_type, api_key)
+        if result["transactions"]:
+            await run_io(result_cache.put, key, result)
+        return result, False
+
+    (result, from_cache), shared = await _inflight.do(key, lookup_or_call)
+    if shared:
+        _stats.coalesced += 1
+        logger.info(f"[GeminiVision] Joined in-flight request ({key[:12]})")
+        return result, "COALESCED"
+    if from_cache:
+        logger.info(f"[GeminiVision] Result cache HIT ({key[:12]})")
+        return result, "HIT"
+    return result, "MISS"
+
+
+async def _extract_upload(data: bytes, mime_type: str, api_key: str) -> dict:
+    """Prepare the upload (image or PDF pages), extract every tile concurrently and merge."""
+    if is_pdf_type(detect_file_type(data)):
+        try:
+            pages = await run_cpu(prepare_vision_pdf, data)
+        except PdfTooLongError as exc:
+            raise VisionError(422, f"{exc}. Use /process-document for longer statements.")
+        _stats.pdf_pages += len(pages)
+    else:
+        pages = [await run_cpu(prepare_vision_image, data, mime_type)]
+        if len(pages[0].tiles) > 1:
+            _stats.tiled_images += 1
+    return await _extract_pages(pages, api_key)
+
+
+async def _extract_pages(pages: List[VisionImage], api_key: str) -> dict:
+    jobs = [(page, tile) for page in pages for tile in page.tiles]
+    if len(jobs) == 1:
+        return await _call_gemini(jobs[0][1], pages[0].mime_type, api_key)
+
+    slots = asyncio.Semaphore(max(1, VISION_MAX_PARALLEL))
+
+    async def extract_tile(page: VisionImage, tile: bytes) -> dict:
+        async with slots:
+            return await _call_gemini(tile, page.mime_type, api_key)
+
+    tasks = [asyncio.ensure_future(extract_tile(page, tile)) for page, tile in jobs]
+    try:
+        parts = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()       # one tile failed — the merged result would have a hole
+        raise
+
+    # Tiles within a page overlap; pages do not
+    transactions: List[dict] = []
+    start = 0
+    for page in pages:
+        page_parts = parts[start:start + len(page.tiles)]
+        start += len(page.tiles)
+        transactions.extend(merge_tile_transactions(
+            [part["transactions"] for part in page_parts], page.overlap_lines
+        ))
+    logger.info(
+        f"[GeminiVision] Merged {sum(len(p['transactions']) for p in parts)} rows "
+        f"from {len(parts)} tiles on {len(pages)} page(s) into {len(transactions)} transactions"
+    )
+    # Pages without rows (cover, summary) do not drag the confidence down
+    confidences = [p["confidence"] for p in parts if p["transactions"]] or [p["confidence"] for p in parts]
+    return {
+        "transactions": transactions,
+        "confidence": min(confidences),
+        "source": "gemini-vision",
+    }
+
+
+async def _call_gemini(image_bytes: bytes, mime_type: str, api_key: str) -> dict:
+    # Gemini REST API — v1beta with gemini-2.5-flash (stable, supports image input on free tier)
+    # See: https://ai.google.dev/gemini-api/docs/models/gemini-2.5-flash
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_VISION_MODEL}:generateContent?key={api_key}"
+
+    payload = {
+        "contents": [
+            {
+                "parts": [
+                    {"text": EXTRACT_PROMPT},
+                    {
+                        "inline_data": {
+                            "mime_type": mime_type,
+                            "data": base64.b64encode(image_bytes).decode("utf-8"),
+                        }
+                    },
+                ]
+            }
+        ],
+        "generationConfig": {
+            "temperature": 0,
+            "maxOutputTokens": 8192,
+        },
+    }
+
+    _stats.gemini_calls += 1
+    try:
+        gemini_response = await gemini_post(url, payload, timeout=90.0)
+    except Exception:
+        _stats.gemini_errors += 1
+        raise
+
+    if gemini_response.status_code != 200:
+        _stats.gemini_errors += 1
+        logger.error(f"[GeminiVision] API error {gemini_response.status_code}: {gemini_response.text[:300]}")
+        raise VisionError(502, f"Gemini API error {gemini_response.status_code}: {gemini_response.text[:200]}")
+
+    data = gemini_response.json()
+    raw = data["candidates"][0]["content"]["parts"][0]["text"].strip()
+    logger.info(f"[GeminiVision] Raw response:\n{raw[:500]}")
+    return _parse_response(raw)
+
+
+def _parse_response(raw: str) -> dict:
+    # Robustly strip markdown fences — handles ```json, ```JSON, ``` with/without newlines
+    fence_match = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", raw, re.IGNORECASE)
+    if fence_match:
+        raw = fence_match.group(1).strip()
+    elif raw.startswith("```"):
+        # Fallback: remove all ``` markers line by line
+        raw = "\n".join(
+            line for line in raw.splitlines()
+            if not line.strip().startswith("```")
+        ).strip()
+
+    # Gemini sometimes returns JSON with a trailing comma before } — fix it
+    raw = re.sub(r",\s*([}\]])", r"\1", raw)
+
+    try:
+        parsed = json.loads(raw)
+    except json.JSONDecodeError as e:
+        logger.error(f"[GeminiVision] JSON parse failed: {e}\nRaw was:\n{raw[:800]}")
+        raise VisionError(502, f"Gemini returned invalid JSON: {str(e)}. Raw: {raw[:200]}")
+
+    transactions = parsed.get("transactions", [])
+    confidence = float(parsed.get("confidence", 0.93))
+
+    # Validate and clean each transaction row
+    # Must match the ParsedTransaction interface in geminiService.ts exactly:
+    # { date, description, upi_ref, source, amount, type, balance }
+    clean = []
+    for t in transactions:
+        try:
+            date_val = t.get("date")
+            upi_ref_val = t.get("upi_ref")
+            source_val = t.get("source")
+
+            clean.append({
+                "date": str(date_val) if date_val is not None and str(date_val).lower() != "null" else "",
+                "description": str(t.get("description") or "Transaction"),
+                "upi_ref": str(upi_ref_val) if upi_ref_val is not None and str(upi_ref_val).lower() != "null" else None,
+                "source": str(source_val).strip() if source_val not in (None, "", "null") else None,
+                "amount": float(t["amount"]) if t.get("amount") is not None else 0.0,
+                "type": "credit" if str(t.get("type", "")).lower() == "credit" else "debit",
+                "balance": float(t["balance"]) if t.get("balance") is not None and str(t.get("balance")).lower() != "null" else None,
+            })
+        except Exception as row_err:
+            logger.warning(f"[GeminiVision] Skipping malformed row: {t} — {row_err}")
+            continue  # skip malformed rows
+
+    logger.info(f"[GeminiVision] Extracted {len(clean)} transactions (confidence={confidence})")
+    return {"transactions": clean, "confidence": confidence, "source": "gemini-vision"}
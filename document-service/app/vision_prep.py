@@ -0,0 +1,248 @@
+"""
+vision_prep.py — Shrink and tile screenshots before they go to Gemini Vision.
+
+Phone screenshots arrive at full resolution (4–8 MB of PNG), and base64
+adds another third on the wire. Gemini reads statement text fine at a
+fraction of that, so uploads are:
+
+  * Downscaled  — to at most VISION_MAX_WIDTH pixels wide (never upscaled)
+  * Re-encoded  — as JPEG at VISION_JPEG_QUALITY; the original bytes are
+                  kept when they are already smaller
+  * Tiled       — images taller than VISION_TILE_HEIGHT (after scaling) are
+                  cut into overlapping horizontal strips. One very tall
+                  image is slow and its answer gets cut off at
+                  maxOutputTokens; strips are sent concurrently instead.
+
+Cuts are moved to the most uniform pixel row near the tile edge (the gap
+between two statement rows), and consecutive tiles overlap by
+VISION_TILE_OVERLAP pixels so a row sliced by one cut is whole in the next
+tile. merge_tile_transactions() then drops the rows read twice — at most
+as many as there are lines of ink in the shared band, so a statement that
+really repeats a row across the cut keeps every copy.
+
+PDF pages are rendered straight to VISION_MAX_WIDTH (no full-size render
+to shrink afterwards) and then go through the same tiling and encoding.
+
+Runs in the CPU pool (OpenCV decode / resize / encode, PyMuPDF rendering).
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.document import DocumentSession
+from app.metrics import timed
+from app.utils import setup_logger
+
+logger = setup_logger("vision-prep")
+
+VISION_MAX_WIDTH = int(os.getenv("VISION_MAX_WIDTH", "1080"))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "80"))
+# Tile height and overlap in pixels, measured after downscaling (0 = never tile)
+VISION_TILE_HEIGHT = int(os.getenv("VISION_TILE_HEIGHT", "2400"))
+VISION_TILE_OVERLAP = int(os.getenv("VISION_TILE_OVERLAP", "240"))
+# PDFs with more pages are refused (each page is at least one Gemini call)
+VISION_MAX_PDF_PAGES = int(os.getenv("VISION_MAX_PDF_PAGES", "20"))
+# Render zoom for PDF pages when VISION_MAX_WIDTH is 0 (2.0 ≈ 144 dpi)
+_DEFAULT_PDF_ZOOM = 2.0
+# A pixel is ink when it is this far from its row's median; a pixel row is
+# blank when under _INK_MIN_SHARE of it is ink (table rules and borders are)
+_INK_CONTRAST = 40
+_INK_MIN_SHARE = 0.02
+
+
+class PdfTooLongError(ValueError):
+    """Raised when a PDF has more pages than VISION_MAX_PDF_PAGES."""
+
+
+def prep_version() -> str:
+    """Settings that change what Gemini sees — part of the result-cache key."""
+    return f"w{VISION_MAX_WIDTH}q{VISION_JPEG_QUALITY}t{VISION_TILE_HEIGHT}o{VISION_TILE_OVERLAP}"
+
+
+@dataclass
+class VisionImage:
+    tiles: List[bytes]          # encoded images, top to bottom
+    mime_type: str
+    width: int = 0              # after downscaling (0 = not decoded, sent as uploaded)
+    height: int = 0
+    # Per cut, the lines of ink in the band both tiles show: no more rows than that can be read twice
+    overlap_lines: List[int] = field(default_factory=list)
+
+    @property
+    def upload_bytes(self) -> int:
+        return sum(len(t) for t in self.tiles)
+
+
+@timed("vision_prep")
+def prepare_vision_image(data: bytes, mime_type: str) -> VisionImage:
+    """Downscaled, re-encoded tiles for one upload; undecodable input passes through unchanged."""
+    import cv2
+
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        logger.warning(f"Could not decode {mime_type} upload — sending it as-is")
+        return VisionImage(tiles=[data], mime_type=mime_type)
+
+    height, width = img.shape[:2]
+    if VISION_MAX_WIDTH > 0 and width > VISION_MAX_WIDTH:
+        scale = VISION_MAX_WIDTH / width
+        img = cv2.resize(img, (VISION_MAX_WIDTH, max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+    prepared = _tile_and_encode(img)
+    if len(prepared.tiles) == 1 and prepared.upload_bytes >= len(data):
+        # Already compact (e.g. a small, flat PNG): re-encoding would not save anything
+        return VisionImage(tiles=[data], mime_type=mime_type, width=prepared.width, height=prepared.height)
+
+    logger.info(
+        f"Vision upload {len(data) // 1024} KB → {len(prepared.tiles)} tile(s), "
+        f"{prepared.upload_bytes // 1024} KB at {prepared.width}x{prepared.height}"
+    )
+    return prepared
+
+
+@timed("vision_prep")
+def prepare_vision_pdf(data: bytes) -> List[VisionImage]:
+    """One prepared image per PDF page, in page order. Raises PdfTooLongError."""
+    with DocumentSession(data) as doc:
+        if doc.page_count > VISION_MAX_PDF_PAGES:
+            raise PdfTooLongError(
+                f"PDF has {doc.page_count} pages; Gemini Vision takes at most {VISION_MAX_PDF_PAGES}"
+            )
+        pages = []
+        for page_no in range(1, doc.page_count + 1):
+            page_width = doc.page_size(page_no)[0]
+            zoom = VISION_MAX_WIDTH / page_width if VISION_MAX_WIDTH > 0 and page_width else _DEFAULT_PDF_ZOOM
+            pages.append(_tile_and_encode(doc.render_color(page_no, zoom)))
+
+    total = sum(p.upload_bytes for p in pages)
+    logger.info(f"Rendered {len(pages)} PDF pages for Gemini Vision ({total // 1024} KB)")
+    return pages
+
+
+def _tile_and_encode(img: np.ndarray) -> VisionImage:
+    height, width = img.shape[:2]
+    bounds = tile_bounds(img)
+    return VisionImage(
+        tiles=[_encode_jpeg(img[top:bottom]) for top, bottom in bounds],
+        mime_type="image/jpeg",
+        width=width,
+        height=height,
+        overlap_lines=overlap_line_counts(img, bounds),
+    )
+
+
+def tile_bounds(img: np.ndarray) -> List[Tuple[int, int]]:
+    """(top, bottom) pixel rows of each tile; one tile unless the image is taller than VISION_TILE_HEIGHT."""
+    height = img.shape[0]
+    if VISION_TILE_HEIGHT <= 0 or height <= VISION_TILE_HEIGHT:
+        return [(0, height)]
+
+    overlap = min(VISION_TILE_OVERLAP, VISION_TILE_HEIGHT // 2)
+    row_spread = _row_spread(img)
+    bounds = []
+    top = 0
+    while True:
+        if height - top <= VISION_TILE_HEIGHT:
+            bounds.append((top, height))
+            return bounds
+        # Cut in the quietest row of the tile's last `overlap` pixels
+        window_start = top + VISION_TILE_HEIGHT - overlap
+        bottom = window_start + int(np.argmin(row_spread[window_start:top + VISION_TILE_HEIGHT]))
+        bounds.append((top, bottom))
+        top = max(bottom - overlap, top + 1)
+
+
+def overlap_line_counts(img: np.ndarray, bounds: List[Tuple[int, int]]) -> List[int]:
+    """For each cut in `bounds`, the runs of inked pixel rows in the band the two tiles share."""
+    counts = []
+    for (_, bottom), (next_top, _) in zip(bounds, bounds[1:]):
+        band = _ink_rows(img[next_top:bottom])
+        counts.append(int(band[0]) + int(np.count_nonzero(band[1:] & ~band[:-1])) if len(band) else 0)
+    return counts
+
+
+def _ink_rows(img: np.ndarray) -> np.ndarray:
+    """Per pixel row, whether it carries text (not just background, shading or a vertical rule)."""
+    import cv2
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    background = np.median(gray, axis=1, keepdims=True)
+    inked = np.abs(gray.astype(np.int16) - background) > _INK_CONTRAST
+    return inked.mean(axis=1) >= _INK_MIN_SHARE
+
+
+def _row_spread(img: np.ndarray) -> np.ndarray:
+    """Per pixel row, the intensity range — 0 for a blank row between two lines of text."""
+    import cv2
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return gray.max(axis=1).astype(np.int16) - gray.min(axis=1)
+
+
+def _encode_jpeg(img: np.ndarray) -> bytes:
+    import cv2
+
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, VISION_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("cv2.imencode failed")
+    return buf.tobytes()
+
+
+# ---------------------------------------------------------------------------
+# Merging per-tile results
+# ---------------------------------------------------------------------------
+
+def merge_tile_transactions(tiles: List[List[dict]], overlap_lines: Optional[List[int]] = None) -> List[dict]:
+    """
+    Concatenate per-tile transactions top to bottom, dropping the rows that
+    the overlap made two tiles read. A tile's leading rows are duplicates
+    when they repeat the previous tile's trailing rows; the previous tile's
+    very last row may be a partial read of a row sliced by the cut, in which
+    case the next tile's whole copy replaces it.
+
+    `overlap_lines` (VisionImage.overlap_lines) caps, per cut, how many rows
+    can have been read twice; without it any matching run counts.
+    """
+    merged: List[dict] = []
+    for i, rows in enumerate(tiles):
+        if merged and rows:
+            limit = overlap_lines[i - 1] if overlap_lines is not None else len(merged)
+            drop_last, shared = _overlap(merged, rows, limit)
+            if drop_last:
+                merged.pop()
+            rows = rows[shared:]
+        merged.extend(rows)
+    return merged
+
+
+def _overlap(prev: List[dict], nxt: List[dict], limit: int) -> Tuple[bool, int]:
+    """
+    (drop prev's last row?, number of leading rows of nxt already in prev).
+    At most `limit` rows of prev, the sliced last one included, lie in the overlap.
+    """
+    for k in range(min(len(prev), len(nxt), limit), 0, -1):
+        if _rows_match(prev[-k:], nxt[:k]):
+            return False, k
+        if len(prev) > k and k < limit and _rows_match(prev[-k - 1:-1], nxt[:k]):
+            return True, k
+    return False, 0
+
+
+def _rows_match(a: List[dict], b: List[dict]) -> bool:
+    return all(_same_row(x, y) for x, y in zip(a, b))
+
+
+def _same_row(a: dict, b: dict) -> bool:
+    if a.get("upi_ref") and b.get("upi_ref"):
+        return a["upi_ref"] == b["upi_ref"]
+    if a.get("date") != b.get("date") or a.get("type") != b.get("type"):
+        return False
+    if abs((a.get("amount") or 0.0) - (b.get("amount") or 0.0)) >= 0.005:
+        return False
+    bal_a, bal_b = a.get("balance"), b.get("balance")
+    return bal_a is None or bal_b is None or abs(bal_a - bal_b) < 0.005
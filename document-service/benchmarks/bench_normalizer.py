@@ -0,0 +1,68 @@
+"""
+bench_normalizer.py — Line-normalizer throughput (lines/sec).
+
+Builds a synthetic statement mixing transaction rows in every supported
+date format with header / noise lines, then times `normalize_text`.
+
+Usage (from document-service/):
+    python -m benchmarks.bench_normalizer --lines 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import List
+
+from app.normalizer import _parse_date, normalize_text
+
+_DATE_FORMATS = [
+    "{y}-{m:02d}-{d:02d}",
+    "{d:02d}/{m:02d}/{y}",
+    "{d} Jan {y}",
+    "Feb {d}, {y}",
+    "{d:02d}-{m:02d}-{yy:02d}",
+]
+
+
+def make_lines(n: int, seed: int = 7) -> List[str]:
+    rnd = random.Random(seed)
+    lines: List[str] = []
+    for i in range(n):
+        if i % 10 == 0:
+            lines.append("Date Narration Ref No. Withdrawal Deposit Closing Balance")
+            continue
+        if i % 10 == 1:
+            lines.append("Page continued — statement of account for the period")
+            continue
+        d, m = rnd.randint(1, 28), rnd.randint(1, 12)
+        date = rnd.choice(_DATE_FORMATS).format(d=d, m=m, y=2024, yy=24)
+        amount = f"{rnd.randint(1, 99999):,}.{rnd.randint(0, 99):02d}"
+        kind = rnd.choice(["UPI/DR/", "UPI/CR/", "NEFT CR ", "ATM WDL "])
+        lines.append(f"{date}  {kind}{rnd.randint(10**11, 10**12)}/MERCHANT {i % 97}  {amount}  {rnd.randint(1000, 90000)}.40")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = "\n".join(make_lines(args.lines))
+    best = float("inf")
+    for _ in range(args.repeat):
+        _parse_date.cache_clear()       # measure cold-cache runs
+        start = time.perf_counter()
+        result = normalize_text(text)
+        best = min(best, time.perf_counter() - start)
+
+    print(f"lines:        {args.lines}")
+    print(f"transactions: {len(result.transactions)}")
+    print(f"best time:    {best:.3f} s")
+    print(f"throughput:   {args.lines / best:,.0f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
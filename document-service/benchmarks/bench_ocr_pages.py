@@ -0,0 +1,67 @@
+"""
+bench_ocr_pages.py — Sequential vs parallel per-page OCR.
+
+Renders synthetic statement pages and times `extract_text_from_images`
+with max_parallel=1 against max_parallel=N for increasing page counts.
+Requires the tesseract binary.
+
+Usage (from document-service/):
+    python -m benchmarks.bench_ocr_pages --pages 1 2 4 8 16 --parallel 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import time
+from typing import List
+
+from PIL import Image, ImageDraw
+
+from app.ocr import extract_text_from_images
+
+
+def make_page(page_no: int, rows: int = 30) -> bytes:
+    """A white A4-ish page with statement-like rows, PNG-encoded."""
+    img = Image.new("L", (1654, 2339), 255)
+    draw = ImageDraw.Draw(img)
+    y = 80
+    draw.text((80, y), f"Page {page_no}  Date  Narration  Debit  Credit  Balance", fill=0)
+    for i in range(rows):
+        y += 60
+        draw.text(
+            (80, y),
+            f"{(i % 28) + 1:02d}-01-24  UPI/DR/97858415{i:04d}/MERCHANT {i}  {100 + i}.00  0.00  {9000 - i}.40",
+            fill=0,
+        )
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _time(images: List[bytes], max_parallel: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extract_text_from_images(images, max_parallel=max_parallel)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'pages':>5}  {'sequential s':>12}  {'parallel s':>10}  {'speedup':>7}")
+    for n in args.pages:
+        images = [make_page(i) for i in range(1, n + 1)]
+        seq = _time(images, 1, args.repeat)
+        par = _time(images, args.parallel, args.repeat)
+        print(f"{n:>5}  {seq:>12.2f}  {par:>10.2f}  {seq / par:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
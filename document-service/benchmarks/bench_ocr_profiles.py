@@ -0,0 +1,94 @@
+"""
+bench_ocr_profiles.py — Throughput and text agreement of OCR preprocessing profiles.
+
+Builds synthetic statement pages in several conditions (clean render, sensor
+noise, faded print, slight rotation) and OCRs each with every profile. Reports
+seconds per page, the mean per-stage timings, and word agreement with the
+"accurate" profile (difflib ratio over the word sequences). For "auto" the
+profile it picked is shown too. Requires the tesseract binary.
+
+Usage (from document-service/):
+    python -m benchmarks.bench_ocr_profiles --repeat 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import difflib
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+
+from app.ocr import ocr_array_with_report
+from benchmarks.bench_ocr_pages import make_page
+
+PROFILES = ["accurate", "balanced", "fast", "auto"]
+
+
+def _clean() -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(make_page(1), np.uint8), cv2.IMREAD_GRAYSCALE)
+
+
+def _noisy(img: np.ndarray) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    noisy = img.astype(np.float32) * 0.85 + 20 + rng.normal(0, 18, img.shape)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def _faded(img: np.ndarray) -> np.ndarray:
+    return (img.astype(np.float32) * 0.35 + 140).astype(np.uint8)
+
+
+def _skewed(img: np.ndarray) -> np.ndarray:
+    h, w = img.shape
+    m = cv2.getRotationMatrix2D((w // 2, h // 2), 2.0, 1.0)
+    return cv2.warpAffine(img, m, (w, h), borderValue=255)
+
+
+CONDITIONS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "clean": lambda img: img,
+    "noisy": _noisy,
+    "faded": _faded,
+    "skewed": _skewed,
+}
+
+
+def _agreement(text: str, reference: str) -> float:
+    return difflib.SequenceMatcher(None, text.split(), reference.split()).ratio()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    base = _clean()
+    print(f"{'condition':<8}  {'profile':<8}  {'s/page':>7}  {'agree':>6}  {'chose':<14}  stage ms")
+    for cond, transform in CONDITIONS.items():
+        page = transform(base)
+        reference = None
+        for profile in PROFILES:
+            best = float("inf")
+            stages: Dict[str, List[float]] = defaultdict(list)
+            chosen: Counter = Counter()
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                text, report = ocr_array_with_report(page, profile)
+                best = min(best, time.perf_counter() - start)
+                chosen[report.profile] += 1
+                for stage, ms in report.timings_ms.items():
+                    stages[stage].append(ms)
+            if reference is None:
+                reference = text          # "accurate" runs first
+            stage_ms = "  ".join(f"{k}={sum(v) / len(v):.0f}" for k, v in stages.items())
+            print(
+                f"{cond:<8}  {profile:<8}  {best:>7.2f}  {_agreement(text, reference):>6.3f}  "
+                f"{chosen.most_common(1)[0][0]:<14}  {stage_ms}"
+            )
+
+
+if __name__ == "__main__":
+    main()
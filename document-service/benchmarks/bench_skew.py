@@ -0,0 +1,75 @@
+"""
+bench_skew.py — Thumbnail projection-profile skew estimation vs full-resolution minAreaRect.
+
+The previous deskew collected the coordinates of every dark pixel of the
+full page (an N×2 int64 array) for cv2.minAreaRect. This compares time, peak
+traced memory and angle error of both estimators on rotated synthetic pages,
+sparse (clean print) and dense (dark, noisy scan). No tesseract needed.
+
+Usage (from document-service/):
+    python -m benchmarks.bench_skew --angles -6 -2 0.8 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from app.ocr import estimate_skew
+from benchmarks.bench_ocr_profiles import _clean, _noisy
+
+
+def min_area_rect_skew(gray: np.ndarray) -> float:
+    """The old estimator, kept here for comparison."""
+    coords = np.column_stack(np.where(gray < 128))
+    if len(coords) < 10:
+        return 0.0
+    angle = cv2.minAreaRect(coords)[-1]
+    if angle < -45:
+        angle = 90 + angle
+    return angle
+
+
+def _rotate(img: np.ndarray, angle: float) -> np.ndarray:
+    h, w = img.shape
+    m = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+    return cv2.warpAffine(img, m, (w, h), borderValue=255)
+
+
+def _measure(fn, page):
+    fn(page)                                   # warm-up
+    tracemalloc.start()
+    start = time.perf_counter()
+    angle = fn(page)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return angle, elapsed * 1000, peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--angles", type=float, nargs="+", default=[-6.0, -2.0, 0.8, 3.0])
+    args = parser.parse_args()
+
+    base = _clean()
+    pages = {
+        "sparse": base,
+        "dense": (_noisy(base).astype(np.float32) * 0.5).astype(np.uint8),
+    }
+    print(f"{'page':<6}  {'angle':>6}  {'estimator':<14}  {'ms':>6}  {'peak KiB':>9}  {'error °':>7}")
+    for kind, page in pages.items():
+        for angle in args.angles:
+            rotated = _rotate(page, angle)
+            for name, fn in (("minAreaRect", min_area_rect_skew), ("projection", estimate_skew)):
+                est, ms, kib = _measure(fn, rotated)
+                # a correcting angle is the negative of the applied rotation
+                print(f"{kind:<6}  {angle:>6.1f}  {name:<14}  {ms:>6.1f}  {kib:>9.0f}  {abs(est + angle):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+bench_table_normalizer.py — Table-row normalization throughput (rows/sec).
+
+Times the old Camelot path (DataFrame.iterrows() → stripped rows →
+normalize_table_rows) against normalize_table_frames, which reads the same
+per-page DataFrames with to_numpy(). Also reports the row parser alone on
+pre-built rows, the ceiling for both. Checks that both paths return
+identical transactions.
+
+Usage (from document-service/):
+    python -m benchmarks.bench_table_normalizer --rows 1000 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import List
+
+import pandas as pd
+
+from app.normalizer import _parse_date, normalize_table_frames, normalize_table_rows
+
+_HEADER = ["Date", "Narration", "Chq/Ref No", "Debit", "Credit", "Balance"]
+_TABLE_ROWS = 40     # rows per Camelot table (≈ one statement page)
+
+
+def make_rows(n: int, seed: int = 11) -> List[List[str]]:
+    rnd = random.Random(seed)
+    rows = [list(_HEADER)]
+    balance = 250000.0
+    for i in range(n):
+        amount = rnd.randint(1, 5_000_000) / 100
+        debit = rnd.random() < 0.7
+        balance += -amount if debit else amount
+        day, month = rnd.randint(1, 28), rnd.randint(1, 12)
+        kind = "UPI/DR/" if debit else rnd.choice(["UPI/CR/", "NEFT CR-"])
+        rows.append([
+            f"{day:02d}/{month:02d}/2024",
+            f"{kind}{rnd.randint(10**11, 10**12)}/MERCHANT {i % 211}",
+            f"{rnd.randint(10**5, 10**6)}" if i % 4 else "",
+            f"{amount:,.2f}" if debit else "",
+            "" if debit else f"{amount:,.2f}",
+            f"{balance:,.2f}",
+        ])
+    return rows
+
+
+def to_frames(rows: List[List[str]]) -> List[pd.DataFrame]:
+    """Split rows into per-page tables with Camelot-like padded cells."""
+    return [
+        pd.DataFrame([[f" {cell}\n" if cell else "" for cell in row] for row in rows[i:i + _TABLE_ROWS]])
+        for i in range(0, len(rows), _TABLE_ROWS)
+    ]
+
+
+def _iterrows_rows(frames: List[pd.DataFrame]):
+    rows = []
+    for df in frames:
+        for _, row in df.iterrows():
+            cleaned_row = [str(cell).strip() for cell in row]
+            if any(cell for cell in cleaned_row):
+                rows.append(cleaned_row)
+    return normalize_table_rows(rows)
+
+
+def _best_of(fn, arg, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        _parse_date.cache_clear()       # measure cold-cache runs
+        start = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'rows only r/s':>13}  {'iterrows r/s':>12}  {'frames r/s':>10}  {'speed-up':>8}  identical")
+    for n in args.rows:
+        rows = make_rows(n)
+        frames = to_frames(rows)
+        _, t_rows = _best_of(normalize_table_rows, rows, args.repeat)
+        legacy, t_legacy = _best_of(_iterrows_rows, frames, args.repeat)
+        framed, t_frames = _best_of(normalize_table_frames, frames, args.repeat)
+        identical = [t.to_dict() for t in legacy.transactions] == [t.to_dict() for t in framed.transactions]
+        print(f"{n:>8}  {n / t_rows:>13,.0f}  {n / t_legacy:>12,.0f}  {n / t_frames:>10,.0f}  "
+              f"{t_legacy / t_frames:>7.1f}x  {identical}")
+
+if __name__ == "__main__":
+    main()
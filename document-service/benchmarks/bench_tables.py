@@ -0,0 +1,100 @@
+"""
+bench_tables.py — Native table engine vs Camelot: speed and row agreement.
+
+Builds synthetic statements (ruled grid and whitespace-only columns, with
+empty Debit / Credit cells), parses each once with parse_pdf, then times
+both engines on the same candidate pages. On ruled pages the native rows
+were already computed by parse_pdf, so its time there is near zero.
+Agreement is the share of Camelot's normalized transactions that the
+native engine reproduces exactly. Camelot needs Ghostscript for lattice
+pages; the native engine needs nothing beyond pdfplumber and PyMuPDF.
+
+Usage (from document-service/):
+    python -m benchmarks.bench_tables --pages 1 5 20 --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import fitz  # PyMuPDF
+
+from app.document import DocumentSession
+from app.native_tables import extract_native_tables
+from app.normalizer import normalize_table_rows
+from app.pdf_parser import parse_pdf
+from app.table_extractor import candidate_pages, extract_tables
+
+_COLUMNS = [(40, "Date"), (110, "Narration"), (330, "Debit"), (400, "Credit"), (470, "Balance")]
+_ROWS_PER_PAGE = 30
+
+
+def make_statement(pages: int, ruled: bool) -> bytes:
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        y = 72
+        for x, title in _COLUMNS:
+            page.insert_text((x, y), title)
+        for i in range(_ROWS_PER_PAGE):
+            y += 16
+            n = p * _ROWS_PER_PAGE + i
+            values = [
+                f"{n % 28 + 1:02d}/{n // 28 % 12 + 1:02d}/2024",
+                f"UPI/DR/{400000 + n}/MERCHANT {n}",
+                f"{100 + n}.00" if n % 3 else "",
+                "" if n % 3 else f"{50 + n}.25",
+                f"{90000 - n * 7}.50",
+            ]
+            for (x, _), value in zip(_COLUMNS, values):
+                if value:
+                    page.insert_text((x, y), value, fontsize=9)
+        if ruled:
+            for x in [x for x, _ in _COLUMNS] + [560]:
+                page.draw_line((x - 4, 60), (x - 4, y + 6))
+            for row_y in range(60, int(y) + 7, 16):
+                page.draw_line((36, row_y), (556, row_y))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _best_of(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'layout':<10}  {'pages':>5}  {'camelot ms':>10}  {'native ms':>9}  "
+          f"{'speed-up':>8}  {'txns':>5}  {'agreement':>9}")
+    for ruled in (True, False):
+        for pages in args.pages:
+            with DocumentSession(make_statement(pages, ruled)) as doc:
+                parsed = parse_pdf(doc)
+                candidates = candidate_pages(parsed)
+                camelot_rows, camelot_ms = _best_of(lambda: extract_tables(doc, candidates), args.repeat)
+                native_rows, native_ms = _best_of(
+                    lambda: extract_native_tables(doc, parsed, candidates), args.repeat
+                )
+
+            expected = [t.to_dict() for t in normalize_table_rows(camelot_rows).transactions]
+            got = [t.to_dict() for t in normalize_table_rows(native_rows).transactions]
+            matched = sum(1 for t in expected if t in got)
+            agreement = matched / len(expected) if expected else float("nan")
+            layout = "ruled" if ruled else "whitespace"
+            print(f"{layout:<10}  {pages:>5}  {camelot_ms:>10.1f}  {native_ms:>9.1f}  "
+                  f"{camelot_ms / native_ms:>7.1f}x  {len(got):>5}  {agreement:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+bench_vision_prep.py — Gemini Vision uploads: raw screenshot vs downscaled tiles.
+
+Draws synthetic phone-statement screenshots (1440 px wide, one transaction
+per 110 px on a shaded card with an avatar, as banking apps draw them) and
+compares what /extract-transactions sends to Gemini:
+
+  * Offline (default) — upload bytes (base64 as sent), prep time, tile
+    count, and a row-count check of the overlap merge: each tile "reads"
+    the rows wholly inside it plus a garbled copy of a row sliced by its
+    bottom edge, and the merged rows must equal the drawn ones. The raw
+    path's row count is estimated from maxOutputTokens (8192) at
+    ~70 output tokens per JSON row, the point where Gemini's answer is cut.
+  * --live — with GEMINI_API_KEY set, also calls Gemini on both paths and
+    reports latency and the rows each returned.
+
+Usage (from document-service/):
+    python -m benchmarks.bench_vision_prep --rows 20 80 200
+    python -m benchmarks.bench_vision_prep --rows 80 --live
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import io
+import os
+import time
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from app.vision_prep import (
+    VISION_MAX_WIDTH,
+    merge_tile_transactions,
+    overlap_line_counts,
+    prepare_vision_image,
+    tile_bounds,
+)
+
+_WIDTH = 1440
+_ROW_HEIGHT = 110
+_TOKENS_PER_ROW = 70
+_MAX_OUTPUT_TOKENS = 8192
+
+
+def make_screenshot(rows: int) -> Tuple[bytes, List[dict]]:
+    """A tall PNG screenshot plus the transactions drawn on it, top to bottom."""
+    img = Image.new("RGB", (_WIDTH, 160 + rows * _ROW_HEIGHT), (250, 250, 252))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=34)
+    draw.text((40, 60), "Account statement — HDFC Bank", fill=(20, 20, 20), font=font)
+    truth = []
+    balance = 50000.0
+    for i in range(rows):
+        y = 160 + i * _ROW_HEIGHT
+        amount = 100.0 + (i * 37) % 900
+        debit = i % 3 != 0
+        balance += -amount if debit else amount
+        row = {
+            "date": f"2024-{i // 28 % 12 + 1:02d}-{i % 28 + 1:02d}",
+            "description": f"UPI/{'DR' if debit else 'CR'}/9785841{i:05d}/MERCHANT {i}",
+            "upi_ref": f"9785841{i:05d}",
+            "amount": amount,
+            "type": "debit" if debit else "credit",
+            "balance": round(balance, 2),
+        }
+        truth.append(row)
+        for x in range(20, _WIDTH - 20, 4):        # card shading
+            shade = 255 - (x * 12) // _WIDTH
+            draw.rectangle((x, y + 4, x + 3, y + _ROW_HEIGHT - 8), fill=(shade, shade, 255))
+        draw.ellipse((_WIDTH - 120, y + 14, _WIDTH - 40, y + 94), fill=((i * 53) % 255, 120, (i * 29) % 255))
+        draw.text((40, y + 14), f"{row['date']}  {row['description']}", fill=(30, 30, 30), font=font)
+        draw.text((40, y + 56), f"{'-' if debit else '+'}{amount:,.2f}   Bal {balance:,.2f}",
+                  fill=(200, 40, 40) if debit else (30, 140, 60), font=font)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue(), truth
+
+
+def simulated_tile_rows(png: bytes, truth: List[dict]) -> Tuple[List[List[dict]], List[int]]:
+    """
+    What each tile would yield: rows wholly inside it, plus a garbled row
+    sliced by its bottom edge. Also returns the overlap line counts per cut.
+    """
+    img = cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_COLOR)
+    scale = min(1.0, VISION_MAX_WIDTH / img.shape[1])
+    if scale < 1.0:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    tiles = []
+    bounds = tile_bounds(img)
+    for top, bottom in bounds:
+        rows = []
+        for i, row in enumerate(truth):
+            y0 = (160 + i * _ROW_HEIGHT) * scale
+            y1 = y0 + (_ROW_HEIGHT - 8) * scale
+            if top <= y0 and y1 <= bottom:
+                rows.append(dict(row))
+            elif y0 < bottom < y1 and y0 + 20 * scale < bottom:
+                rows.append({**row, "upi_ref": None, "amount": row["amount"] / 10, "balance": None})
+        tiles.append(rows)
+    return tiles, overlap_line_counts(img, bounds)
+
+
+async def _live(png: bytes, api_key: str) -> Tuple[Tuple[float, int], Tuple[float, int]]:
+    from app.executor import start_pools
+    from app.http_client import start_http_client
+    from app.vision import _call_gemini, _extract_image
+
+    start_pools()
+    start_http_client()
+    start = time.perf_counter()
+    raw = await _call_gemini(png, "image/png", api_key)
+    raw_s = time.perf_counter() - start
+    start = time.perf_counter()
+    tiled = await _extract_image(png, "image/png", api_key)
+    tiled_s = time.perf_counter() - start
+    return (raw_s, len(raw["transactions"])), (tiled_s, len(tiled["transactions"]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 80, 200])
+    parser.add_argument("--live", action="store_true", help="also call Gemini (needs GEMINI_API_KEY)")
+    args = parser.parse_args()
+    api_key = os.getenv("GEMINI_API_KEY", "")
+    if args.live and not api_key:
+        parser.error("--live needs GEMINI_API_KEY")
+
+    print(f"{'rows':>5}  {'raw KB':>7}  {'tiled KB':>8}  {'saved':>6}  {'prep ms':>7}  {'tiles':>5}  "
+          f"{'raw rows*':>9}  {'merged rows':>11}  exact")
+    for n in args.rows:
+        png, truth = make_screenshot(n)
+        start = time.perf_counter()
+        image = prepare_vision_image(png, "image/png")
+        prep_ms = (time.perf_counter() - start) * 1000
+
+        raw_kb = len(base64.b64encode(png)) / 1024
+        tiled_kb = sum(len(base64.b64encode(t)) for t in image.tiles) / 1024
+        merged = merge_tile_transactions(*simulated_tile_rows(png, truth))
+        raw_rows = min(n, _MAX_OUTPUT_TOKENS // _TOKENS_PER_ROW)
+        print(f"{n:>5}  {raw_kb:>7.0f}  {tiled_kb:>8.0f}  {1 - tiled_kb / raw_kb:>6.0%}  {prep_ms:>7.1f}  "
+              f"{len(image.tiles):>5}  {raw_rows:>9}  {len(merged):>11}  {merged == truth}")
+
+        if args.live:
+            (raw_s, raw_n), (tiled_s, tiled_n) = asyncio.run(_live(png, api_key))
+            print(f"       live: raw {raw_s:.1f} s / {raw_n} rows — tiled {tiled_s:.1f} s / {tiled_n} rows")
+    print("* estimated: rows that fit in maxOutputTokens")
+
+
+if __name__ == "__main__":
+    main()
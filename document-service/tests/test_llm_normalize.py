@@ -0,0 +1,64 @@
+"""LLM-phase answers are validated per chunk before they reach reconciliation."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import normalizer
+from app.normalizer import Transaction
+from app.reconcile import reconcile
+
+
+def _gemini_answer(rows) -> httpx.Response:
+    body = {"candidates": [{"content": {"parts": [{"text": json.dumps(rows)}]}}]}
+    return httpx.Response(200, json=body)
+
+
+def _patch_gemini(monkeypatch, rows):
+    async def fake_post(url, payload, timeout):
+        return _gemini_answer(rows)
+
+    monkeypatch.setattr(normalizer, "gemini_post", fake_post)
+    monkeypatch.setattr(normalizer, "LLM_ENABLED", True)
+    monkeypatch.setattr(normalizer, "GEMINI_API_KEY", "test-key")
+
+
+def test_string_and_null_balances_are_coerced(monkeypatch):
+    _patch_gemini(monkeypatch, [
+        {"date": "2024-01-01", "description": "Opening", "amount": "100.00", "type": "credit", "balance": "1,100.00"},
+        {"date": "2024-01-02", "description": "Shop", "amount": 50, "type": "Debit", "balance": None},
+        {"date": "2024-01-03", "description": "Cafe", "amount": "25.50", "type": "debit", "balance": "1024.50"},
+    ])
+    parsed = [Transaction("2024-01-01", "Opening", 100.0, "credit", 1100.0)]
+
+    rows = asyncio.run(normalizer._llm_chunk("raw text", parsed))
+
+    assert [t.balance for t in rows] == [1100.0, None, 1024.5]
+    assert [t.amount for t in rows] == [100.0, 50.0, 25.5]
+    assert rows[1].type == "debit"
+    check = reconcile(rows)
+    assert check.checked == 1 and check.failed == 0
+
+
+def test_malformed_row_falls_back_to_regex_for_the_chunk(monkeypatch):
+    _patch_gemini(monkeypatch, [
+        {"date": "2024-01-01", "description": "Shop", "amount": 10, "type": "debit", "balance": "n/a"},
+    ])
+    regex = [Transaction("2024-01-01", "Shop", 10.0, "debit", 990.0)]
+
+    result = asyncio.run(normalizer.llm_normalize("01/01/2024 Shop 10.00 990.00", regex))
+
+    assert result == regex
+
+
+@pytest.mark.parametrize("bad", [
+    {"date": "someday", "amount": 1, "type": "debit"},
+    {"date": "2024-01-01", "amount": 1, "type": "transfer"},
+    {"date": "2024-01-01", "type": "debit"},
+])
+def test_bad_row_raises_inside_the_chunk(monkeypatch, bad):
+    _patch_gemini(monkeypatch, [bad])
+    with pytest.raises(ValueError):
+        asyncio.run(normalizer._llm_chunk("raw", []))
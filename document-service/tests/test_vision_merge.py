@@ -0,0 +1,51 @@
+"""Tile merging drops only rows the overlap band can have shown twice."""
+
+import numpy as np
+
+from app import vision_prep
+from app.vision_prep import merge_tile_transactions, overlap_line_counts, tile_bounds
+
+
+def _row(day: int, amount: float = 20.0, **extra) -> dict:
+    return {"date": f"2024-01-{day:02d}", "type": "debit", "amount": amount, "balance": None, **extra}
+
+
+def test_repeated_rows_across_a_cut_are_kept():
+    # Four identical tea purchases (no upi_ref, no balance); only the second
+    # lies in the overlap band, so the next tile's first copy is its re-read
+    tea = _row(5)
+    first = [_row(1, 500.0), tea, tea]
+    second = [tea, tea, tea, _row(6, 75.0)]
+
+    merged = merge_tile_transactions([first, second], overlap_lines=[1])
+
+    assert merged == [_row(1, 500.0), tea, tea, tea, tea, _row(6, 75.0)]
+    # Uncapped, the repeats look like a two-row overlap and one purchase is lost
+    assert len(merge_tile_transactions([first, second])) == 5
+
+
+def test_sliced_last_row_is_replaced_within_the_band():
+    whole = _row(3, 120.0, balance=880.0)
+    first = [_row(1, 500.0), _row(2, 1000.0), {**whole, "amount": 12.0, "balance": None}]
+    second = [_row(2, 1000.0), whole, _row(4, 40.0)]
+
+    assert merge_tile_transactions([first, second], overlap_lines=[2]) == first[:2] + second[1:]
+    # A one-line band cannot hold both the shared row and the sliced one: nothing is merged
+    assert len(merge_tile_transactions([first, second], overlap_lines=[1])) == 6
+
+
+def test_overlap_line_counts_ignore_vertical_rules(monkeypatch):
+    monkeypatch.setattr(vision_prep, "VISION_TILE_HEIGHT", 1000)
+    monkeypatch.setattr(vision_prep, "VISION_TILE_OVERLAP", 200)
+    img = np.full((2500, 800), 255, np.uint8)
+    for top in range(40, 2500, 100):
+        img[top:top + 30, 50:400] = 0          # a line of text every 100 px
+    img[:, [20, 780]] = 0                      # table borders
+
+    bounds = tile_bounds(img)
+    counts = overlap_line_counts(img, bounds)
+
+    assert len(counts) == len(bounds) - 1 >= 2
+    for (_, bottom), (next_top, _), count in zip(bounds, bounds[1:], counts):
+        lines = sum(1 for top in range(40, 2500, 100) if top < bottom and top + 30 > next_top)
+        assert count == lines